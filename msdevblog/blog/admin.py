@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from blog.models import Category, Post, Comment, BlogTag
+from blog.models import Category, Post, Comment, BlogTag, UploadedImage
 
 
 @admin.register(Category)
@@ -31,4 +31,11 @@ class CommentAdmin(admin.ModelAdmin):
 
 @admin.register(BlogTag)
 class BlogTagAdmin(admin.ModelAdmin):
-    list_display = ['name', 'slug']  # поля для отображения
+    list_display = ['name', 'slug', 'published_count']  # поля для отображения
+
+
+@admin.register(UploadedImage)
+class UploadedImageAdmin(admin.ModelAdmin):
+    list_display = ['name', 'width', 'height', 'time_created']  # поля для отображения
+    search_fields = ['name']  # поиск по этим полям
+    readonly_fields = ['name', 'width', 'height', 'variants', 'time_created']
@@ -0,0 +1,230 @@
+"""
+Ключи кэша блога и их инвалидация.
+
+Производные данные (боковая панель и т.п.) хранятся в пространствах имен с версией:
+    version:<namespace>                   - текущая версия пространства имен.
+Запись в БД вызывает bump_version(namespace), после чего все процессы
+сразу читают ключи новой версии, а старые удаляются по истечении срока хранения.
+
+Страница поста кэшируется фрагментами:
+    post_meta:<slug>                      - id, автор и время изменения поста (поиск поста по slug без БД);
+    post_article:<id>:<time_updated>      - отрисованный текст поста с тегами и автором;
+    post_comments:<id>                    - отрисованный список комментариев;
+    post_comments_changed:<id>            - время последнего изменения комментариев (для ETag страницы поста).
+Фрагменты сбрасываются обработчиками сигналов (blog/signals.py) при изменении
+постов, комментариев и тегов, поэтому время хранения может быть большим.
+
+Результаты поиска хранятся недолго и только как список id постов:
+    search:<md5 нормализованного запроса> - id найденных постов в порядке ранга (пространство имен SEARCH);
+    search_facets:<md5 запроса и фильтров> - id постов с учетом фильтров и счетчики фильтров (SEARCH);
+    search_headline:<id>:<time_updated>:<md5 запроса> - фрагмент текста поста с найденными словами.
+
+Карта сайта кэшируется постранично и сбрасывается только для страниц с измененными постами:
+    sitemap:index                         - индекс карты сайта;
+    sitemap:<section>:<page>              - страница карты сайта раздела.
+
+RSS ленты кэшируются целиком и сбрасываются при изменении их постов:
+    feed:<section>:<slug>                 - XML ленты (latest - все посты, category, tag).
+
+Страницы блога для анонимных читателей кэшируются целиком (blog.middlewares.AnonymousPageCacheMiddleware):
+    page:<md5 пути и параметров страницы> - HTML страницы (пространство имен PAGES).
+
+Производные данные читаются через get_or_compute, которая защищает от
+одновременного пересчета одного ключа множеством запросов (cache stampede).
+"""
+import pickle
+import zlib
+from hashlib import md5
+from math import log
+from random import random
+from time import time, time_ns, sleep
+
+from django.core.cache import cache
+from django.core.cache.backends.redis import RedisSerializer
+from django.utils import timezone
+
+POST_CACHE_TIMEOUT = 60 * 60 * 24   # сутки
+SIDEBAR_TIMEOUT = 60 * 60           # час, актуальность обеспечивает bump_version
+SEARCH_TIMEOUT = 60 * 5             # 5 минут
+SEARCH_HEADLINE_TIMEOUT = 60 * 60   # час, ключ меняется вместе с временем изменения поста
+SITEMAP_TIMEOUT = 60 * 60 * 24      # сутки
+FEED_TIMEOUT = 60 * 60 * 24         # сутки
+PAGE_CACHE_TIMEOUT = 60 * 10        # 10 минут, актуальность обеспечивает bump_version
+
+LOCK_TIMEOUT = 10                   # максимальное время пересчета значения, секунд
+LOCK_POLL = 0.05                    # интервал проверки значения, пересчитываемого другим процессом, секунд
+STALE_FACTOR = 2                    # устаревшее значение хранится в кэше еще (STALE_FACTOR - 1) * timeout
+EARLY_REFRESH_BETA = 1.0            # > 1 - пересчитывать раньше, < 1 - позже
+
+SIDEBAR = 'sidebar'                 # категории, новые посты и теги боковой панели
+SEARCH = 'search'                   # результаты поиска постов
+PAGES = 'pages'                     # страницы блога целиком
+
+
+class CompressedRedisSerializer(RedisSerializer):
+    """
+    Сериализатор для RedisCache, сжимает zlib значения больше COMPRESS_MIN_LENGTH байт.
+    Сжатые данные отличаются от pickle по первому байту (0x78 против 0x80).
+    Для применения указываем в настройках settings.py:
+        CACHES['default']['OPTIONS']['serializer'] = 'blog.caching.CompressedRedisSerializer'
+    """
+    COMPRESS_MIN_LENGTH = 1024
+
+    def dumps(self, obj):
+        data = super().dumps(obj)
+        if isinstance(data, bytes) and len(data) >= self.COMPRESS_MIN_LENGTH:
+            return zlib.compress(data)
+        return data
+
+    def loads(self, data):
+        try:
+            return int(data)
+        except ValueError:
+            if data[:1] == b'\x78':
+                data = zlib.decompress(data)
+            return pickle.loads(data)
+
+
+def get_or_compute(key, compute, timeout, version=None):
+    """
+    Возвращает значение из кэша или рассчитывает его функцией compute().
+
+    Защита от одновременного пересчета (cache stampede):
+    - значение пересчитывает только процесс, получивший короткую блокировку (cache.add);
+    - значение хранится в кэше в STALE_FACTOR раз дольше срока актуальности, поэтому
+      после истечения срока, пока идет пересчет, остальные процессы отдают прежнее значение;
+    - если значения нет совсем (первый запрос, новая версия пространства имен), остальные
+      процессы ждут, пока пересчет не закончится, и не считают значение сами;
+    - незадолго до истечения срока значение с некоторой вероятностью пересчитывается
+      заранее (probabilistic early expiration), тем вероятнее, чем ближе срок и
+      чем дольше пересчет. Поэтому истечение срока под нагрузкой вызывает один пересчет.
+
+    В кэше хранится кортеж (значение, время пересчета, время истечения срока актуальности).
+    """
+    lock_key = f'{key}:lock'
+    while True:
+        entry = cache.get(key, version=version)
+        if entry is not None:
+            value, delta, expiry = entry
+            if time() - delta * EARLY_REFRESH_BETA * log(1 - random()) < expiry:
+                return value
+            if not cache.add(lock_key, 1, LOCK_TIMEOUT, version=version):
+                return value    # пересчитывает другой процесс, отдаем прежнее значение
+            break
+        if cache.add(lock_key, 1, LOCK_TIMEOUT, version=version):
+            break
+        # значения нет и его пересчитывает другой процесс - ждем значение или снятия блокировки
+        # (блокировка снимается и при ошибке пересчета, не дольше чем через LOCK_TIMEOUT)
+        sleep(LOCK_POLL)
+
+    try:
+        start = time()
+        value = compute()
+        delta = time() - start
+        cache.set(key, (value, delta, time() + timeout), timeout * STALE_FACTOR, version=version)
+    finally:
+        cache.delete(lock_key, version=version)
+    return value
+
+
+def _version_key(namespace):
+    return f'version:{namespace}'
+
+
+def get_version(namespace):
+    """
+    Возвращает текущую версию пространства имен кэша.
+    Начальная версия берется от текущего времени, чтобы после вытеснения ключа
+    версии из кэша не вернуться к уже использованному номеру.
+    """
+    version = cache.get(_version_key(namespace))
+    if version is None:
+        cache.add(_version_key(namespace), time_ns() // 1000, None)
+        version = cache.get(_version_key(namespace))
+    return version
+
+
+def bump_version(namespace):
+    """ Делает недействительными все ключи пространства имен, возвращает новую версию """
+    try:
+        return cache.incr(_version_key(namespace))
+    except ValueError:  # ключа версии нет в кэше
+        cache.add(_version_key(namespace), time_ns() // 1000, None)
+        return cache.get(_version_key(namespace))
+
+
+def post_meta_key(slug):
+    return f'post_meta:{slug}'
+
+
+def post_article_key(post_id, time_updated):
+    return f'post_article:{post_id}:{time_updated.timestamp()}'
+
+
+def post_comments_key(post_id):
+    return f'post_comments:{post_id}'
+
+
+def search_key(query):
+    return f'search:{md5(query.encode()).hexdigest()}'
+
+
+def search_facets_key(query, cat, tag):
+    facets = f'{query}|{cat or ""}|{tag or ""}'
+    return f'search_facets:{md5(facets.encode()).hexdigest()}'
+
+
+def search_headline_key(post_id, time_updated, query):
+    return f'search_headline:{post_id}:{time_updated.timestamp()}:{md5(query.encode()).hexdigest()}'
+
+
+def sitemap_key(section=None, page=None):
+    return f'sitemap:{section}:{page}' if section else 'sitemap:index'
+
+
+def invalidate_sitemap(section, first_page, last_page):
+    """ Сбрасывает индекс и страницы карты сайта раздела с first_page по last_page """
+    cache.delete_many([sitemap_key(), *(sitemap_key(section, page) for page in range(first_page, last_page + 1))])
+
+
+def feed_key(section, slug=None):
+    return f'feed:{section}:{slug or ""}'
+
+
+def invalidate_feeds(category_slugs=(), tag_slugs=()):
+    """ Сбрасывает общую ленту и ленты указанных категорий и тегов """
+    cache.delete_many([feed_key('latest'),
+                       *(feed_key('category', slug) for slug in category_slugs),
+                       *(feed_key('tag', slug) for slug in tag_slugs)])
+
+
+def page_key(path, params):
+    return f'page:{md5(f"{path}?{params}".encode()).hexdigest()}'
+
+
+def invalidate_post_article(post_id, slug, time_updated):
+    """ Сбрасывает кэш поиска поста по slug и отрисованный текст поста """
+    cache.delete_many([post_meta_key(slug), post_article_key(post_id, time_updated)])
+
+
+def post_comments_changed_key(post_id):
+    return f'post_comments_changed:{post_id}'
+
+
+def get_comments_changed(post_id):
+    """
+    Время последнего изменения комментариев поста (добавление, изменение, удаление любого комментария).
+    При отсутствии в кэше берется текущее время: по данным БД удаление или изменение
+    не последнего комментария не определить, а прежнее значение не должно вернуться.
+    """
+    changed = cache.get(post_comments_changed_key(post_id))
+    if changed is None:
+        cache.add(post_comments_changed_key(post_id), timezone.now(), POST_CACHE_TIMEOUT)
+        changed = cache.get(post_comments_changed_key(post_id))
+    return changed
+
+
+def invalidate_post_comments(post_id):
+    """ Сбрасывает кэш отрисованных комментариев поста и обновляет время изменения комментариев """
+    cache.delete(post_comments_key(post_id))
+    cache.set(post_comments_changed_key(post_id), timezone.now(), POST_CACHE_TIMEOUT)
@@ -1,22 +1,102 @@
+from hashlib import md5
+from time import time
+
 from django.contrib.syndication.views import Feed
-from django.template.defaultfilters import truncatewords_html
-from django.urls import reverse_lazy
-from .models import Post
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse_lazy, reverse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from .caching import FEED_TIMEOUT, feed_key, get_or_compute
+from .models import Post, Category, BlogTag
+
+
+class CachedFeedMixin:
+    """
+    Отдает XML ленты из кэша (сбрасывается сигналами при изменении постов ленты, blog/signals.py)
+    с заголовками ETag по хэшу XML и Last-Modified по времени его отрисовки, поэтому
+    повторный опрос ленты получает 304 Not Modified без обращения к БД.
+    ETag по содержимому меняется при любом изменении ленты, в т.ч. при удалении из нее не самого нового поста.
+    """
+    section = None
+
+    def __call__(self, request, *args, **kwargs):
+        def render():
+            obj = self.get_object(request, *args, **kwargs)
+            feed = self.get_feed(obj, request)
+            content = feed.writeString('utf-8')
+            return content, feed.content_type, md5(content.encode()).hexdigest(), int(time())
+
+        content, content_type, digest, rendered = get_or_compute(feed_key(self.section, kwargs.get('slug')),
+                                                                 render, FEED_TIMEOUT)
+        response = HttpResponse(content, content_type=content_type)
+        response.headers['ETag'] = f'"{digest}"'
+        response.headers['Last-Modified'] = http_date(rendered)
+        return get_conditional_response(request, etag=response.headers['ETag'],
+                                        last_modified=rendered, response=response)
 
 
-class LatestPostsFeed(Feed):
+class LatestPostsFeed(CachedFeedMixin, Feed):
+    section = 'latest'
     title = 'MS DevBlog'
     link = reverse_lazy('blog:home')
     description = 'Новые посты на сайте MSDevBlog.'
 
-    def items(self):
-        return Post.published.all()[:5]
+    def get_queryset(self, obj):
+        return Post.published.only('title', 'slug', 'excerpt', 'time_created', 'time_updated')
+
+    def items(self, obj=None):
+        return self.get_queryset(obj)[:5]
 
     def item_title(self, item):
         return item.title
 
     def item_description(self, item):
-        return truncatewords_html(item.body, 30)
+        return item.excerpt
 
     def item_pubdate(self, item):
         return item.time_created
+
+    def item_updateddate(self, item):
+        return item.time_updated
+
+
+class CategoryPostsFeed(LatestPostsFeed):
+    """ Новые посты категории: /feed/category/<slug>/ """
+    section = 'category'
+
+    def get_object(self, request, slug):
+        return get_object_or_404(Category.objects.only('title', 'slug'), slug=slug)
+
+    def title(self, obj):
+        return f'MS DevBlog: {obj.title}'
+
+    def link(self, obj):
+        return reverse('blog:category', args=[obj.slug])
+
+    def description(self, obj):
+        return f'Новые посты категории "{obj.title}" на сайте MSDevBlog.'
+
+    def get_queryset(self, obj):
+        return super().get_queryset(obj).filter(cat=obj)
+
+
+class TagPostsFeed(LatestPostsFeed):
+    """ Новые посты с тегом: /feed/tag/<slug>/ """
+    section = 'tag'
+
+    def get_object(self, request, slug):
+        return get_object_or_404(BlogTag.objects.only('name', 'slug'), slug=slug)
+
+    def title(self, obj):
+        return f'MS DevBlog: {obj.name}'
+
+    def link(self, obj):
+        return reverse('blog:tag', args=[obj.slug])
+
+    def description(self, obj):
+        return f'Новые посты с тегом "{obj.name}" на сайте MSDevBlog.'
+
+    def get_queryset(self, obj):
+        return super().get_queryset(obj).filter(tags=obj)
@@ -0,0 +1,176 @@
+"""
+Уменьшенные копии изображений, загруженных в редакторе поста (CkeditorCustomStorage).
+
+После загрузки Celery (blog.tasks.make_image_variants) сохраняет рядом с оригиналом
+копии шириной IMAGE_WIDTHS (только меньше исходной) и копию исходной ширины в WebP,
+для изображения шириной 2000px:
+    ab/cd/<sha256>.jpg -> <sha256>-480w.webp, <sha256>-480w.jpg, ..., <sha256>-1200w.jpg, <sha256>-2000w.webp
+Копии в формате для браузеров без поддержки WebP (fallback) - в исходном формате, для WebP - в JPEG.
+
+При сохранении поста рассчитывается html для показа (render_images): изображения получают
+размеры и ленивую загрузку, изображения с готовыми копиями заворачиваются в <picture>
+с srcset/sizes, браузер выбирает копию по ширине экрана.
+"""
+import os
+import re
+from itertools import count
+from html import unescape
+from io import BytesIO
+from urllib.parse import quote, unquote
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from PIL import Image, ImageOps
+
+from .utils import CkeditorCustomStorage
+
+IMAGE_WIDTHS = (480, 600, 1200)         # изображения в тексте не шире 600px (figure img в blog.css),
+IMAGE_SIZES = '(max-width: 600px) 100vw, 600px'    # 1200 - для экранов с двойной плотностью
+WEBP_QUALITY = 80
+FALLBACK_QUALITY = 85
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+
+# формат исходного изображения -> формат и расширение копии для браузеров без WebP
+FALLBACK_FORMATS = {
+    'JPEG': ('JPEG', 'jpg'),
+    'PNG': ('PNG', 'png'),
+    'WEBP': ('JPEG', 'jpg'),
+}
+
+_IMG_RE = re.compile(r'<img\b[^>]*>', re.IGNORECASE)
+_SRC_RE = re.compile(r'\ssrc\s*=\s*"([^"]*)"', re.IGNORECASE)
+_TAG_RE = re.compile(r'<[a-z][^>]*>', re.IGNORECASE)
+_ATTR_RE = re.compile(r'\s[\w:.-]+\s*=\s*(?:"([^"]*)"|\'([^\']*)\')')
+
+
+def uploads_storage():
+    """
+    Хранилище загрузок редактора без раскладки по папкам дат:
+    копии сохраняются рядом с оригиналом по заданному имени.
+    """
+    return FileSystemStorage(location=CkeditorCustomStorage.location, base_url=CkeditorCustomStorage.base_url)
+
+
+def is_image(name):
+    return os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS
+
+
+def _save_image(storage, image, name, image_format, quality):
+    if image_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    buffer = BytesIO()
+    image.save(buffer, image_format, quality=quality, optimize=True)
+    if storage.exists(name):     # задача перезапущена - перезаписываем копию
+        storage.delete(name)
+    return storage.save(name, ContentFile(buffer.getvalue()))
+
+
+def make_variants(name):
+    """
+    Сохраняет уменьшенные копии загруженного изображения.
+    Возвращает (ширина, высота, копии), копии - список
+    {'width': ..., 'webp': <имя>, 'fallback': <имя>} по возрастанию ширины.
+    """
+    storage = uploads_storage()
+    with storage.open(name) as file:
+        image = Image.open(file)
+        image_format = image.format
+        image = ImageOps.exif_transpose(image)  # фото с камеры могут быть повернуты тегом EXIF
+        image.load()
+    width, height = image.size
+    if image_format not in FALLBACK_FORMATS or getattr(image, 'is_animated', False):
+        return width, height, []
+
+    fallback_format, fallback_ext = FALLBACK_FORMATS[image_format]
+    stem = os.path.splitext(name)[0]
+    variants = []
+    for variant_width in [w for w in IMAGE_WIDTHS if w < width] + [width]:
+        if variant_width == width:
+            resized = image
+        else:
+            resized = image.resize((variant_width, round(height * variant_width / width)), Image.LANCZOS)
+        if variant_width == width and image_format == fallback_format:
+            fallback = name     # исходная ширина в исходном формате - сам оригинал
+        else:
+            fallback = _save_image(storage, resized, f'{stem}-{variant_width}w.{fallback_ext}',
+                                   fallback_format, FALLBACK_QUALITY)
+        webp = _save_image(storage, resized, f'{stem}-{variant_width}w.webp', 'WEBP', WEBP_QUALITY)
+        variants.append({'width': variant_width, 'webp': webp, 'fallback': fallback})
+    return width, height, variants
+
+
+def upload_name(src):
+    """ Имя файла в хранилище загрузок по адресу изображения, None - изображение не из загрузок """
+    base_url = CkeditorCustomStorage.base_url
+    if base_url not in src:
+        return None
+    return unquote(unescape(src).split(base_url, 1)[1].split('?')[0])
+
+
+def upload_names(html):
+    """ Имена загруженных файлов всех изображений html """
+    names = set()
+    for img in _IMG_RE.findall(html):
+        src = _SRC_RE.search(img)
+        if src and (name := upload_name(src.group(1))):
+            names.add(name)
+    return names
+
+
+def referenced_upload_names(html):
+    """
+    Имена загруженных файлов, на которые ссылается html в любом атрибуте любого тега:
+    не только <img src>, но и <a href> (ссылка на изображение в полном размере), srcset и т.д.
+    """
+    names = set()
+    for tag in _TAG_RE.findall(html):
+        for double_quoted, single_quoted in _ATTR_RE.findall(tag):
+            value = double_quoted or single_quoted
+            # значение целиком и адреса из списка srcset: "<адрес> 480w, <адрес> 600w"
+            for url in [value, *(entry.split()[0] for entry in value.split(',') if entry.strip())]:
+                if name := upload_name(url):
+                    names.add(name)
+    return names
+
+
+def _has_attr(img, attr):
+    return re.search(rf'\s{attr}\s*=', img, re.IGNORECASE) is not None
+
+
+def render_images(html, images):
+    """
+    Подготавливает изображения html поста к показу (один раз, при сохранении поста):
+    - размеры width/height из данных загрузки - браузер резервирует место, страница не "прыгает";
+    - первое изображение обычно на первом экране - загружается с высоким приоритетом (fetchpriority),
+      остальные лениво (loading="lazy"), только при прокрутке к ним;
+    - изображения с готовыми копиями заворачиваются в <picture> с srcset/sizes.
+    images - {имя файла: UploadedImage}. Атрибуты, заданные автором, не меняются.
+    """
+    def srcset(src_prefix, variants, key):
+        return ', '.join(f'{src_prefix}{quote(variant[key])} {variant["width"]}w' for variant in variants)
+
+    def replace_img(match):
+        img = match.group()
+        is_first = next(position) == 0
+        src = _SRC_RE.search(img)
+        image = images.get(upload_name(src.group(1))) if src else None
+        attrs = ''
+        if image is not None and not _has_attr(img, 'width') and not _has_attr(img, 'height'):
+            attrs += f' width="{image.width}" height="{image.height}"'
+        if not _has_attr(img, 'loading') and not _has_attr(img, 'fetchpriority'):
+            attrs += ' fetchpriority="high"' if is_first else ' loading="lazy"'
+        if not _has_attr(img, 'decoding'):
+            attrs += ' decoding="async"'
+        with_srcset = image is not None and image.variants and not _has_attr(img, 'srcset')
+        if with_srcset:
+            # префикс адреса берем из исходного src, чтобы копии имели тот же вид адреса (абсолютный, с хостом)
+            src_prefix = src.group(1).split(CkeditorCustomStorage.base_url, 1)[0] + CkeditorCustomStorage.base_url
+            attrs += f' srcset="{srcset(src_prefix, image.variants, "fallback")}" sizes="{IMAGE_SIZES}"'
+        new_img = img[:-1].rstrip('/ ') + attrs + '>'
+        if not with_srcset:
+            return new_img
+        return (f'<picture><source type="image/webp" srcset="{srcset(src_prefix, image.variants, "webp")}" '
+                f'sizes="{IMAGE_SIZES}">{new_img}</picture>')
+
+    position = count()
+    return _IMG_RE.sub(replace_img, html)
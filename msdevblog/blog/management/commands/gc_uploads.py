@@ -0,0 +1,56 @@
+import os
+from datetime import timedelta
+from time import time
+
+from django.core.management.base import BaseCommand
+
+from blog.images import referenced_upload_names, uploads_storage
+from blog.models import Post, UploadedImage
+
+BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    """
+    Удаляет загруженные в редакторе файлы, на которые не ссылается ни один пост,
+    вместе с уменьшенными копиями изображений (blog/images.py).
+    Файлы моложе --min-age не удаляются: пост с только что загруженным файлом может быть еще не сохранен.
+    Запуск: python manage.py gc_uploads [--dry-run] [--min-age 24]
+    """
+    help = 'Удаляет неиспользуемые загрузки редактора (сборка мусора хранилища CkeditorCustomStorage)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Только показать файлы для удаления')
+        parser.add_argument('--min-age', type=int, default=24, help='Минимальный возраст файла, часов')
+
+    def referenced_files(self):
+        """ Файлы, на которые ссылаются посты (в т.ч. черновики), и копии этих изображений """
+        names = set()
+        for body in Post.objects.values_list('body', flat=True).iterator(chunk_size=BATCH_SIZE):
+            names |= referenced_upload_names(body)
+        files = set(names)
+        for variants in UploadedImage.objects.filter(name__in=names).values_list('variants', flat=True):
+            for variant in variants:
+                files.update((variant['webp'], variant['fallback']))
+        return files
+
+    def handle(self, *args, **options):
+        storage = uploads_storage()
+        referenced = self.referenced_files()
+        max_mtime = time() - timedelta(hours=options['min_age']).total_seconds()
+        removed = []
+        for directory, _, files in os.walk(storage.location):
+            for file_name in files:
+                path = os.path.join(directory, file_name)
+                name = os.path.relpath(path, storage.location).replace(os.sep, '/')
+                if name in referenced or os.path.getmtime(path) > max_mtime:
+                    continue
+                removed.append(name)
+                if not options['dry_run']:
+                    os.remove(path)
+        if not options['dry_run']:
+            UploadedImage.objects.filter(name__in=removed).delete()
+        for name in removed:
+            self.stdout.write(name)
+        action = 'К удалению' if options['dry_run'] else 'Удалено'
+        self.stdout.write(self.style.SUCCESS(f'{action} файлов: {len(removed)}'))
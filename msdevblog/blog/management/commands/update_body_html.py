@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from blog.caching import PAGES, bump_version, invalidate_post_article
+from blog.images import upload_names
+from blog.models import Post, UploadedImage
+from blog.tasks import make_image_variants
+
+BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    """
+    Пересчитывает html для показа (размеры, ленивая загрузка и копии изображений) всех постов.
+    У измененных постов обновляется время изменения и сбрасывается кэш страниц,
+    иначе кэш, ETag и Last-Modified страниц поста отдавали бы прежний html.
+    С --make-variants ставит в очередь Celery расчет копий изображений, загруженных
+    до их появления, посты с ними будут пересчитаны задачей.
+    Запуск: python manage.py update_body_html [--make-variants]
+    """
+    help = 'Пересчитывает html для показа (body_html) всех постов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--make-variants', action='store_true',
+                            help='Рассчитать копии изображений, для которых их еще нет')
+
+    def update(self, batch):
+        """ Сохраняет html и время изменения, затем сбрасывает кэш страниц постов по прежнему времени """
+        updated = Post.objects.bulk_update([post for post, _ in batch], ['body_html', 'time_updated'])
+        for post, time_updated in batch:
+            invalidate_post_article(post.pk, post.slug, time_updated)
+        return updated
+
+    def handle(self, *args, **options):
+        batch, updated, names = [], 0, set()
+        now = timezone.now()
+        for post in Post.objects.only('id', 'slug', 'body', 'body_html', 'time_updated') \
+                .iterator(chunk_size=BATCH_SIZE):
+            body_html, time_updated = post.body_html, post.time_updated
+            post.update_body_html()
+            names |= upload_names(post.body or '')
+            if post.body_html == body_html:
+                continue
+            post.time_updated = now
+            batch.append((post, time_updated))
+            if len(batch) == BATCH_SIZE:
+                updated += self.update(batch)
+                batch = []
+        if batch:
+            updated += self.update(batch)
+        if updated:
+            bump_version(PAGES)
+        self.stdout.write(self.style.SUCCESS(f'Обновлено постов: {updated}'))
+
+        if options['make_variants']:
+            missing = names - set(UploadedImage.objects.filter(name__in=names).values_list('name', flat=True))
+            for name in missing:
+                make_image_variants.delay(name)
+            self.stdout.write(self.style.SUCCESS(f'Поставлено в очередь изображений: {len(missing)}'))
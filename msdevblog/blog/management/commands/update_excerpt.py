@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from blog.models import Post
+
+BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    """
+    Пересчитывает анонс, число слов и время чтения всех постов.
+    Запуск: python manage.py update_excerpt
+    """
+    help = 'Пересчитывает анонс (excerpt), число слов и время чтения всех постов'
+
+    def handle(self, *args, **options):
+        fields = ['excerpt', 'word_count', 'reading_time']
+        batch, updated = [], 0
+        for post in Post.objects.only('id', 'body').iterator(chunk_size=BATCH_SIZE):
+            post.update_excerpt()
+            batch.append(post)
+            if len(batch) == BATCH_SIZE:
+                updated += Post.objects.bulk_update(batch, fields)
+                batch = []
+        if batch:
+            updated += Post.objects.bulk_update(batch, fields)
+        self.stdout.write(self.style.SUCCESS(f'Обновлено постов: {updated}'))
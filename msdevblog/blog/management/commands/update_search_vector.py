@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from blog.models import Post, POST_SEARCH_VECTOR
+
+
+class Command(BaseCommand):
+    """
+    Пересчитывает поисковый вектор всех постов.
+    Запуск: python manage.py update_search_vector
+    """
+    help = 'Пересчитывает поисковый вектор (search_vector) всех постов'
+
+    def handle(self, *args, **options):
+        updated = Post.objects.update(search_vector=POST_SEARCH_VECTOR)
+        self.stdout.write(self.style.SUCCESS(f'Обновлено постов: {updated}'))
@@ -0,0 +1,95 @@
+"""
+Отдача медиа файлов (загрузки редактора, копии изображений) в режиме settings.MEDIA_SERVE_MODE.
+
+В режимах 'x-accel' и 'x-sendfile' Django только проверяет путь и ставит заголовки,
+сам файл (в т.ч. запросы Range) отдает веб-сервер, процессы Python не заняты передачей.
+В режиме 'django' файл читается по частям CHUNK_SIZE, поддерживаются запросы Range.
+
+Файлы с хэшем содержимого в имени (CkeditorCustomStorage.content_addressed и их копии)
+никогда не меняются, браузер кэширует их на год без перепроверки (immutable).
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+from django.views.static import was_modified_since
+from ranged_response import RangedFileReader, RangedFileResponse
+
+from msdevblog.settings import MEDIA_ROOT, MEDIA_SERVE_MODE, MEDIA_ACCEL_PREFIX, MEDIA_MAX_AGE
+
+IMMUTABLE_MAX_AGE = 60 * 60 * 24 * 365      # год
+CHUNK_SIZE = 64 * 1024
+
+# ab/cd/<sha256>.jpg и копии изображений <sha256>-480w.webp
+_HASHED_NAME_RE = re.compile(r'(^|/)[0-9a-f]{64}(-\d+w)?\.\w+$')
+
+
+class ChunkedFileReader(RangedFileReader):
+    """ RangedFileReader без чтения файла целиком: размер передается из os.stat """
+
+    def __init__(self, file, size):
+        self.f = file
+        self.size = size
+        self.block_size = CHUNK_SIZE
+        self.start = 0
+        self.stop = size
+
+
+class ChunkedRangedFileResponse(RangedFileResponse):
+    """ RangedFileResponse, читающий файл по частям (исходный читает файл в память для расчета размера) """
+
+    def __init__(self, request, file, size, **kwargs):
+        self.ranged_file = ChunkedFileReader(file, size)
+        FileResponse.__init__(self, self.ranged_file, **kwargs)
+        self._resource_closers.append(file.close)
+        self['Accept-Ranges'] = 'bytes'
+        self['Content-Length'] = size
+        if 'HTTP_RANGE' in request.META:
+            self.add_range_headers(request.META['HTTP_RANGE'])
+            if self.status_code == 416:
+                self.ranged_file.stop = 0
+                self['Content-Range'] = f'bytes */{size}'
+                self['Content-Length'] = 0
+
+
+def cache_control(path):
+    if _HASHED_NAME_RE.search(path):
+        return f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+    return f'public, max-age={MEDIA_MAX_AGE}'
+
+
+@require_safe
+def serve_media(request, path):
+    """ Медиа файл по пути относительно MEDIA_ROOT """
+    try:
+        full_path = safe_join(MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404('Файл не найден.')
+    if not os.path.isfile(full_path):
+        raise Http404('Файл не найден.')
+
+    stat = os.stat(full_path)
+    content_type, encoding = mimetypes.guess_type(full_path)
+    content_type = content_type or 'application/octet-stream'
+    if not was_modified_since(request.META.get('HTTP_IF_MODIFIED_SINCE'), stat.st_mtime):
+        response = HttpResponseNotModified()
+    elif MEDIA_SERVE_MODE == 'x-accel':
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = quote(MEDIA_ACCEL_PREFIX + path)
+    elif MEDIA_SERVE_MODE == 'x-sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = full_path
+    else:
+        response = ChunkedRangedFileResponse(request, open(full_path, 'rb'), stat.st_size,
+                                             content_type=content_type)
+        if encoding:
+            response['Content-Encoding'] = encoding
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    response['Cache-Control'] = cache_control(path)
+    return response
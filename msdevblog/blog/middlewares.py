@@ -1,15 +1,80 @@
 import logging
+from collections import namedtuple
+from math import log
 
-from django.shortcuts import render
+from django.contrib.messages import get_messages
 from django.core.cache import cache
+from django.http import HttpResponse
+from django.shortcuts import render
+from django.utils.cache import get_conditional_response, parse_http_date_safe
+from django.utils.http import urlencode
+from django.utils.functional import SimpleLazyObject
 
-from msdevblog.settings import DEBUG
+from msdevblog.settings import DEBUG, TAG_CLOUD_SIZE
+from .caching import SIDEBAR, SIDEBAR_TIMEOUT, PAGES, PAGE_CACHE_TIMEOUT, get_version, get_or_compute, page_key
 from .models import Category, Post, BlogTag
 
 
 logger = logging.getLogger(__name__)
 
 
+class AnonymousPageCacheMiddleware:
+    """
+    Кэширует страницы блога (главная, категории, теги, посты) целиком для анонимных читателей.
+    Закэшированная страница отдается до вызова представления, контекстных процессоров и шаблонов.
+
+    Кэш пропускается для авторизованных пользователей, запросов кроме GET/HEAD,
+    при непоказанных сообщениях (django.contrib.messages) и для ответов, устанавливающих cookie.
+    Ключ страницы учитывает только параметры, от которых она зависит (page, cursor).
+    Кэш сбрасывается сигналами изменения постов, категорий, тегов и комментариев (blog/signals.py).
+
+    Для применения указываем в настройках settings.py после AuthenticationMiddleware и MessageMiddleware:
+        MIDDLEWARE += ['blog.middlewares.AnonymousPageCacheMiddleware']
+    """
+    url_names = {'home', 'category', 'tag', 'post-detail'}
+    query_params = ('page', 'cursor')
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        key = getattr(request, 'page_cache_key', None)
+        if key and request.method == 'GET' and response.status_code == 200 \
+                and not response.streaming and not response.cookies:
+            cache.set(key, (response.content, response.headers['Content-Type'],
+                            response.headers.get('ETag'), response.headers.get('Last-Modified')),
+                      PAGE_CACHE_TIMEOUT, version=request.page_cache_version)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not self.is_cacheable(request):
+            return None
+
+        params = urlencode([(name, request.GET[name]) for name in self.query_params if name in request.GET])
+        request.page_cache_key = page_key(request.path, params)
+        request.page_cache_version = get_version(PAGES)
+        entry = cache.get(request.page_cache_key, version=request.page_cache_version)
+        if entry is None:
+            return None
+
+        content, content_type, etag, last_modified = entry
+        response = HttpResponse(content, content_type=content_type)
+        if etag:
+            response.headers['ETag'] = etag
+        if last_modified:
+            response.headers['Last-Modified'] = last_modified
+        return get_conditional_response(request, etag=etag, last_modified=parse_http_date_safe(last_modified or ''),
+                                        response=response)
+
+    def is_cacheable(self, request):
+        match = request.resolver_match
+        return (request.method in ('GET', 'HEAD')
+                and match.namespace == 'blog' and match.url_name in self.url_names
+                and not request.user.is_authenticated
+                and not len(get_messages(request)))
+
+
 class MiddlewareAllException:
     def __init__(self, get_response):
         """
@@ -76,21 +141,48 @@ class MiddlewareAllException:
         return render(request, 'blog/exception_page.html')
 
 
-def categories(request):
-    """ Добавляет информацию о категориях в контекст """
-    _categories = cache.get_or_set('categories', Category.objects.values('title', 'slug'), 300)  # 5 минут
-    return {'categories': _categories}
-
-
-def new_posts(request):
-    """ Добавляет информацию о пяти новых постах в контекст """
-    _new_posts = cache.get_or_set('new_posts',
-                                  Post.published.values('title', 'slug').order_by('-time_updated')[:5],
-                                  300)  # 5 минут
-    return {'new_posts': _new_posts}
-
-
-def tags_list(request):
-    """ Добавляет информацию о тегах в контекст """
-    _tags = cache.get_or_set('tags', BlogTag.objects.all(), 300)  # 5 минут
-    return {'tags_list': _tags}
+# Компактные записи боковой панели, в кэше хранятся кортежи, а не экземпляры моделей
+SidebarCategory = namedtuple('SidebarCategory', 'title slug')
+SidebarPost = namedtuple('SidebarPost', 'title slug')
+SidebarTag = namedtuple('SidebarTag', 'name slug count weight')
+
+TAG_CLOUD_WEIGHTS = 5   # число градаций размера тега в облаке
+
+
+def _tag_cloud():
+    """
+    Облако тегов: TAG_CLOUD_SIZE тегов с наибольшим числом опубликованных постов.
+    Вес тега от 1 до TAG_CLOUD_WEIGHTS пропорционален логарифму числа постов.
+    """
+    rows = list(BlogTag.objects.filter(published_count__gt=0)
+                .order_by('-published_count', 'name')
+                .values_list('name', 'slug', 'published_count')[:TAG_CLOUD_SIZE])
+    max_count = rows[0][2] if rows else 1
+    return [SidebarTag(name, slug, count,
+                       1 + int((TAG_CLOUD_WEIGHTS - 1) * log(count) / log(max_count)) if max_count > 1 else 1)
+            for name, slug, count in rows]
+
+
+def _load_sidebar():
+    """ Данные боковой панели целиком: категории, пять новых постов и облако тегов """
+    return {
+        'categories': [SidebarCategory(*row) for row in Category.objects.values_list('title', 'slug')],
+        'new_posts': [SidebarPost(*row) for row in
+                      Post.published.values_list('title', 'slug').order_by('-time_updated')[:5]],
+        'tags_list': _tag_cloud(),
+    }
+
+
+def sidebar(request):
+    """
+    Добавляет в контекст категории (categories), новые посты (new_posts) и теги (tags_list).
+    Данные ленивые: кэш (и при необходимости БД) читается один раз для всех трех списков
+    и только если шаблон их действительно использует.
+    """
+    data = SimpleLazyObject(lambda: get_or_compute('sidebar', _load_sidebar,
+                                                   SIDEBAR_TIMEOUT, version=get_version(SIDEBAR)))
+    return {
+        'categories': SimpleLazyObject(lambda: data['categories']),
+        'new_posts': SimpleLazyObject(lambda: data['new_posts']),
+        'tags_list': SimpleLazyObject(lambda: data['tags_list']),
+    }
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.1 on 2026-10-18 14:39
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+
+
+def fill_search_vector(apps, schema_editor):
+    Post = apps.get_model('blog', 'Post')
+    Post._base_manager.update(search_vector=SearchVector('title', weight='A', config='russian') +
+                              SearchVector('body', weight='B', config='russian'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0006_blogtag_taggedblog_alter_post_tags'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='Поисковый вектор'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='blog_post_search_vector_gin'),
+        ),
+        migrations.RunPython(fill_search_vector, migrations.RunPython.noop),
+    ]
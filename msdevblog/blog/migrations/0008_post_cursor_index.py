@@ -0,0 +1,17 @@
+# Generated by Django 4.2.1 on 2026-10-18 14:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0007_post_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['status', '-time_created', '-id'], name='blog_post_status_created_idx'),
+        ),
+    ]
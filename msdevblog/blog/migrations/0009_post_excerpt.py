@@ -0,0 +1,55 @@
+# Generated by Django 4.2.1 on 2026-10-18 14:44
+
+from math import ceil
+
+from django.db import migrations, models
+from django.template.defaultfilters import truncatewords_html
+from django.utils.html import strip_tags
+
+BATCH_SIZE = 500
+
+
+def make_excerpt(body):
+    """ Копия blog.utils.make_excerpt на момент миграции: анонс 30 слов, 200 слов в минуту """
+    word_count = len(strip_tags(body).split())
+    reading_time = max(1, ceil(word_count / 200))
+    return truncatewords_html(body, 30), word_count, reading_time
+
+
+def fill_excerpt(apps, schema_editor):
+    Post = apps.get_model('blog', 'Post')
+    batch = []
+    for post in Post._base_manager.only('id', 'body').iterator(chunk_size=BATCH_SIZE):
+        post.excerpt, post.word_count, post.reading_time = make_excerpt(post.body or '')
+        batch.append(post)
+        if len(batch) == BATCH_SIZE:
+            Post._base_manager.bulk_update(batch, ['excerpt', 'word_count', 'reading_time'])
+            batch = []
+    if batch:
+        Post._base_manager.bulk_update(batch, ['excerpt', 'word_count', 'reading_time'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0008_post_cursor_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='excerpt',
+            field=models.TextField(blank=True, default='', editable=False, verbose_name='Анонс поста'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='reading_time',
+            field=models.PositiveSmallIntegerField(default=1, editable=False, verbose_name='Время чтения, мин.'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='word_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Число слов'),
+        ),
+        migrations.RunPython(fill_excerpt, migrations.RunPython.noop),
+    ]
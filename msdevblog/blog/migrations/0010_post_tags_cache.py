@@ -0,0 +1,34 @@
+# Generated by Django 4.2.1 on 2026-10-18 14:45
+
+from django.contrib.postgres.aggregates import JSONBAgg
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, JSONObject
+
+
+def fill_tags_cache(apps, schema_editor):
+    Post = apps.get_model('blog', 'Post')
+    TaggedBlog = apps.get_model('blog', 'TaggedBlog')
+    tags = TaggedBlog.objects.filter(object_id=OuterRef('pk'),
+                                     content_type__app_label='blog',
+                                     content_type__model='post') \
+        .values('object_id') \
+        .annotate(data=JSONBAgg(JSONObject(name='tag__name', slug='tag__slug'), ordering='tag__name')) \
+        .values('data')
+    Post._base_manager.update(tags_cache=Coalesce(Subquery(tags), Value([], output_field=models.JSONField())))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0009_post_excerpt'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='tags_cache',
+            field=models.JSONField(blank=True, default=list, editable=False, verbose_name='Теги (кэш)'),
+        ),
+        migrations.RunPython(fill_tags_cache, migrations.RunPython.noop),
+    ]
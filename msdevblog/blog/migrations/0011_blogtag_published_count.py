@@ -0,0 +1,35 @@
+# Generated by Django 4.2.1 on 2026-10-18 14:56
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_published_count(apps, schema_editor):
+    BlogTag = apps.get_model('blog', 'BlogTag')
+    Post = apps.get_model('blog', 'Post')
+    TaggedBlog = apps.get_model('blog', 'TaggedBlog')
+    published = TaggedBlog.objects.filter(tag=OuterRef('pk'),
+                                          content_type__app_label='blog',
+                                          content_type__model='post',
+                                          object_id__in=Post._base_manager.filter(status='PB').values('pk')) \
+        .values('tag') \
+        .annotate(count=Count('pk')) \
+        .values('count')
+    BlogTag.objects.update(published_count=Coalesce(Subquery(published), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0010_post_tags_cache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blogtag',
+            name='published_count',
+            field=models.PositiveIntegerField(db_index=True, default=0, editable=False, verbose_name='Опубликованных постов'),
+        ),
+        migrations.RunPython(fill_published_count, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.1 on 2026-10-18 15:09
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0011_blogtag_published_count'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddIndex(
+            model_name='blogtag',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['name'], name='blog_blogtag_name_trgm', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['title'], name='blog_post_title_trgm', opclasses=['gin_trgm_ops']),
+        ),
+    ]
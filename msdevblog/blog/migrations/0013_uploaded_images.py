@@ -0,0 +1,41 @@
+# Generated by Django 4.2.1 on 2026-10-18 15:30
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def fill_body_html(apps, schema_editor):
+    # копий изображений еще нет, html для показа совпадает с текстом поста
+    Post = apps.get_model('blog', 'Post')
+    Post._base_manager.update(body_html=F('body'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0012_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadedImage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True, verbose_name='Файл')),
+                ('width', models.PositiveIntegerField(verbose_name='Ширина')),
+                ('height', models.PositiveIntegerField(verbose_name='Высота')),
+                ('variants', models.JSONField(blank=True, default=list, verbose_name='Копии')),
+                ('time_created', models.DateTimeField(auto_now_add=True, verbose_name='Время загрузки')),
+            ],
+            options={
+                'verbose_name': 'Изображение',
+                'verbose_name_plural': 'Изображения',
+            },
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='body_html',
+            field=models.TextField(blank=True, default='', editable=False, verbose_name='Текст поста (html)'),
+        ),
+        migrations.RunPython(fill_body_html, migrations.RunPython.noop),
+    ]
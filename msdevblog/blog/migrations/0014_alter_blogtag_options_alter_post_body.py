@@ -0,0 +1,23 @@
+# Generated by Django 4.2.1 on 2026-10-18 15:57
+
+from django.db import migrations
+import django_ckeditor_5.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0013_uploaded_images'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='blogtag',
+            options={'verbose_name': 'Тег', 'verbose_name_plural': 'Теги'},
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='body',
+            field=django_ckeditor_5.fields.CKEditor5Field(verbose_name='Текст поста'),
+        ),
+    ]
@@ -1,5 +1,10 @@
 from django.conf import settings
+from django.contrib.postgres.aggregates import JSONBAgg
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
 from django.db import models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, JSONObject
 from django.urls import reverse
 
 from taggit.managers import TaggableManager
@@ -8,17 +13,27 @@ from django_ckeditor_5.fields import CKEditor5Field
 
 # стандартная библиотека не работает с русскими символами, используем свою
 from msdevblog.utilites import slugify as to_slugify
+from .images import render_images, upload_names
+from .utils import make_excerpt
 
 
 # Пакет taggit использует функцию django.utils.text.slugify() для расчета slug.
 # Переопределяем модели Тегов с целью использовать свою функцию slugify.
 class BlogTag(TagBase):
+    # число опубликованных постов с тегом для облака тегов, поддерживается сигналами (blog/signals.py)
+    published_count = models.PositiveIntegerField(default=0, db_index=True, editable=False,
+                                                  verbose_name='Опубликованных постов')
+
     def slugify(self, tag, i=None):
         return to_slugify(tag)
 
     class Meta:
         verbose_name = 'Тег'
         verbose_name_plural = 'Теги'
+        indexes = [
+            # подсказки поиска по триграммам (blog/search.py)
+            GinIndex(fields=['name'], opclasses=['gin_trgm_ops'], name='blog_blogtag_name_trgm'),
+        ]
 
 
 class TaggedBlog(GenericTaggedItemBase):
@@ -35,6 +50,12 @@ class PublishedManager(models.Manager):
         return super().get_queryset().filter(status=Post.Status.PUBLISHED)
 
 
+# Поисковый вектор поста: совпадения в названии весят больше, чем в тексте.
+# config='russian' - настраиваем удаление русских стоп слов и выделение основ слов
+POST_SEARCH_VECTOR = SearchVector('title', weight='A', config='russian') + \
+                     SearchVector('body', weight='B', config='russian')
+
+
 class Category(models.Model):
     title = models.CharField(max_length=255, verbose_name='Название категории')
     slug = models.SlugField(max_length=255, unique=True, db_index=True, verbose_name='URL')
@@ -59,11 +80,20 @@ class Post(models.Model):
     title = models.CharField(max_length=255, verbose_name='Название поста')
     slug = models.SlugField(max_length=255, unique_for_date='time_created', verbose_name='URL')
     body = CKEditor5Field('Текст поста', config_name='extends')
+    # html для показа: текст поста с уменьшенными копиями изображений (srcset), рассчитывается при сохранении
+    body_html = models.TextField(blank=True, default='', editable=False, verbose_name='Текст поста (html)')
+    excerpt = models.TextField(blank=True, default='', editable=False, verbose_name='Анонс поста')
+    word_count = models.PositiveIntegerField(default=0, editable=False, verbose_name='Число слов')
+    reading_time = models.PositiveSmallIntegerField(default=1, editable=False, verbose_name='Время чтения, мин.')
     time_created = models.DateTimeField(auto_now_add=True, verbose_name='Время создания')
     time_updated = models.DateTimeField(auto_now=True, verbose_name='Время последнего изменения')
     status = models.CharField(max_length=2, choices=Status.choices,
                               default=Status.DRAFT, verbose_name='Статус')
     tags = TaggableManager(through=TaggedBlog, verbose_name='Теги')
+    search_vector = SearchVectorField(null=True, editable=False, verbose_name='Поисковый вектор')
+    # снимок тегов поста [{'name': ..., 'slug': ...}, ...] для списков постов без запроса к TaggedBlog,
+    # поддерживается сигналами (blog/signals.py)
+    tags_cache = models.JSONField(default=list, blank=True, editable=False, verbose_name='Теги (кэш)')
 
     published = PublishedManager()
     objects = models.Manager()  # указываем и менеджер по умолчанию, иначе он будет недоступен
@@ -72,10 +102,36 @@ class Post(models.Model):
         return f'{self.title} - {self.user}'
 
     def save(self, *args, **kwargs):
-        """ Добавляем slug на основе поля title, если он не был передан """
+        """
+        Добавляем slug на основе поля title, если он не был передан,
+        рассчитываем анонс, html для показа и поисковый вектор при изменении текста поста.
+        """
         if not self.slug or self.slug == '':
             self.slug = to_slugify(self.title)
-        return super().save(*args, **kwargs)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'body' in update_fields:
+            self.update_excerpt()
+            self.update_body_html()
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'excerpt', 'word_count', 'reading_time', 'body_html'}
+        super().save(*args, **kwargs)
+        if update_fields is None or {'title', 'body'} & set(update_fields):
+            self.update_search_vector()
+
+    def update_excerpt(self):
+        """ Рассчитывает анонс, число слов и время чтения по тексту поста """
+        self.excerpt, self.word_count, self.reading_time = make_excerpt(self.body or '')
+
+    def update_body_html(self):
+        """ Рассчитывает html для показа: размеры, ленивая загрузка и копии (srcset) изображений """
+        body = self.body or ''
+        names = upload_names(body)
+        images = UploadedImage.objects.in_bulk(names, field_name='name') if names else {}
+        self.body_html = render_images(body, images)
+
+    def update_search_vector(self):
+        """ Пересчитывает поисковый вектор поста на стороне БД """
+        Post.objects.filter(pk=self.pk).update(search_vector=POST_SEARCH_VECTOR)
 
     def get_absolute_url(self):
         return reverse('blog:post-detail', args=[self.slug])
@@ -84,6 +140,40 @@ class Post(models.Model):
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
         ordering = ['-time_created', 'cat']
+        indexes = [
+            GinIndex(fields=['search_vector'], name='blog_post_search_vector_gin'),
+            # пагинация курсором по (time_created, id) среди опубликованных постов
+            models.Index(fields=['status', '-time_created', '-id'], name='blog_post_status_created_idx'),
+            # подсказки поиска по триграммам (blog/search.py)
+            GinIndex(fields=['title'], opclasses=['gin_trgm_ops'], name='blog_post_title_trgm'),
+        ]
+
+
+def update_tags_cache(post_ids):
+    """ Обновляет снимок тегов (Post.tags_cache) у постов с указанными id одним запросом """
+    tags = TaggedBlog.objects.filter(object_id=OuterRef('pk'),
+                                     content_type__app_label=Post._meta.app_label,
+                                     content_type__model=Post._meta.model_name) \
+        .values('object_id') \
+        .annotate(data=JSONBAgg(JSONObject(name='tag__name', slug='tag__slug'), ordering='tag__name')) \
+        .values('data')
+    return Post.objects.filter(pk__in=post_ids) \
+        .update(tags_cache=Coalesce(Subquery(tags), Value([], output_field=models.JSONField())))
+
+
+def update_tag_counts(tag_ids):
+    """
+    Пересчитывает число опубликованных постов (BlogTag.published_count) только у указанных тегов,
+    по индексу TaggedBlog.tag_id, без группировки по всей таблице.
+    """
+    published = TaggedBlog.objects.filter(tag=OuterRef('pk'),
+                                          content_type__app_label=Post._meta.app_label,
+                                          content_type__model=Post._meta.model_name,
+                                          object_id__in=Post.published.values('pk')) \
+        .values('tag') \
+        .annotate(count=Count('pk')) \
+        .values('count')
+    return BlogTag.objects.filter(pk__in=tag_ids).update(published_count=Coalesce(Subquery(published), 0))
 
 
 class Comment(models.Model):
@@ -101,3 +191,20 @@ class Comment(models.Model):
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
         ordering = ['-time_created']
+
+
+class UploadedImage(models.Model):
+    """ Изображение, загруженное в редакторе поста, и его уменьшенные копии (blog/images.py) """
+    name = models.CharField(max_length=255, unique=True, verbose_name='Файл')  # имя в CkeditorCustomStorage
+    width = models.PositiveIntegerField(verbose_name='Ширина')
+    height = models.PositiveIntegerField(verbose_name='Высота')
+    # [{'width': ..., 'webp': <имя файла>, 'fallback': <имя файла>}, ...] по возрастанию ширины
+    variants = models.JSONField(default=list, blank=True, verbose_name='Копии')
+    time_created = models.DateTimeField(auto_now_add=True, verbose_name='Время загрузки')
+
+    class Meta:
+        verbose_name = 'Изображение'
+        verbose_name_plural = 'Изображения'
+
+    def __str__(self):
+        return self.name
@@ -0,0 +1,128 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+from collections.abc import Sequence
+from datetime import datetime
+
+from django.db.models import Q
+from django.http import Http404
+
+from msdevblog.settings import PAGINATE_BY_CONST
+
+
+class CursorPage(Sequence):
+    """
+    Страница пагинации курсором.
+    Вместо номеров страниц хранит курсоры на соседние страницы.
+    """
+    is_cursor = True
+
+    def __init__(self, object_list, has_next, has_previous, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.has_next = has_next
+        self.has_previous = has_previous
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def __repr__(self):
+        return f'<CursorPage next={self.next_cursor} previous={self.previous_cursor}>'
+
+
+class CursorPaginator:
+    """
+    Пагинация по ключу (keyset/cursor) для постов.
+
+    Страница выбирается условием по паре (time_created, id), что соответствует
+    сортировке Post.Meta.ordering, вместо OFFSET и COUNT(*). Поэтому стоимость
+    выборки не зависит от "глубины" страницы.
+
+    Курсор - строка вида 'n<time_created>|<id>' ('n' - следующая страница,
+    'p' - предыдущая) закодированная в base64.
+    """
+    NEXT = 'n'
+    PREVIOUS = 'p'
+
+    def __init__(self, queryset, per_page):
+        self.queryset = queryset
+        self.per_page = per_page
+
+    @staticmethod
+    def encode_cursor(direction, obj):
+        value = f'{direction}{obj.time_created.isoformat()}|{obj.pk}'
+        return urlsafe_b64encode(value.encode()).decode().rstrip('=')
+
+    @staticmethod
+    def decode_cursor(cursor):
+        """ Возвращает (направление, time_created, id), Http404 если курсор поврежден """
+        try:
+            value = urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+            direction, value = value[0], value[1:]
+            time_created, pk = value.split('|')
+            if direction not in (CursorPaginator.NEXT, CursorPaginator.PREVIOUS):
+                raise ValueError
+            return direction, datetime.fromisoformat(time_created), int(pk)
+        except (BinasciiError, UnicodeDecodeError, IndexError, ValueError):
+            raise Http404('Неверный курсор страницы.')
+
+    def page(self, cursor=None):
+        if not cursor:
+            direction = self.NEXT
+            queryset = self.queryset.order_by('-time_created', '-id')
+        else:
+            direction, time_created, pk = self.decode_cursor(cursor)
+            if direction == self.NEXT:
+                queryset = self.queryset.filter(
+                    Q(time_created__lt=time_created) | Q(time_created=time_created, id__lt=pk)
+                ).order_by('-time_created', '-id')
+            else:
+                queryset = self.queryset.filter(
+                    Q(time_created__gt=time_created) | Q(time_created=time_created, id__gt=pk)
+                ).order_by('time_created', 'id')
+
+        # выбираем на одну запись больше, чтобы узнать есть ли следующая страница
+        object_list = list(queryset[:self.per_page + 1])
+        has_more = len(object_list) > self.per_page
+        object_list = object_list[:self.per_page]
+
+        if direction == self.NEXT:
+            has_next, has_previous = has_more, bool(cursor)
+        else:
+            object_list.reverse()
+            has_next, has_previous = True, has_more
+
+        return CursorPage(
+            object_list,
+            has_next=has_next,
+            has_previous=has_previous,
+            next_cursor=self.encode_cursor(self.NEXT, object_list[-1]) if has_next and object_list else None,
+            previous_cursor=self.encode_cursor(self.PREVIOUS, object_list[0]) if has_previous and object_list else None,
+        )
+
+
+class CursorPaginationMixin:
+    """
+    Подключает к ListView пагинацию курсором (параметр ?cursor=...),
+    если установлен атрибут cursor_pagination = True.
+    Иначе используется стандартный Paginator с номерами страниц.
+    """
+    cursor_pagination = False
+    cursor_kwarg = 'cursor'
+
+    def get_paginate_by(self, queryset):
+        # в режиме курсора страницы ограничены всегда, даже если paginate_by не задан
+        if self.cursor_pagination:
+            return self.paginate_by or PAGINATE_BY_CONST
+        return super().get_paginate_by(queryset)
+
+    def paginate_queryset(self, queryset, page_size):
+        if not self.cursor_pagination:
+            return super().paginate_queryset(queryset, page_size)
+
+        paginator = CursorPaginator(queryset, page_size)
+        page = paginator.page(self.request.GET.get(self.cursor_kwarg))
+        return paginator, page, page.object_list, page.has_next or page.has_previous
@@ -0,0 +1,216 @@
+"""
+Полнотекстовый поиск постов.
+
+Поиск выполняется по сохраненному вектору Post.search_vector (GIN индекс).
+Слова запроса, набранные латиницей, дополняются вариантом в кириллице
+("flask urok" -> "(flask | фласк) & (urok | урок)"). Вариант добавляется
+в тот же tsquery, поэтому запрос остается одним проходом по индексу,
+а перевод слов кэшируется в памяти процесса.
+
+Результат поиска (id постов в порядке ранга, не более SEARCH_MAX_RESULTS)
+недолго кэшируется по нормализованному запросу, поэтому повторные популярные
+запросы и переход по страницам результатов не ранжируют посты заново.
+
+Результаты можно сузить по категории и тегу (фильтры, facets). Число найденных
+постов в каждой категории и теге считается одним запросом с группировкой
+по уже найденным id, выбранные фильтры применяются по индексам.
+
+Фрагменты текста с выделенными найденными словами (SearchHeadline) дорогие,
+поэтому рассчитываются одним запросом только для постов текущей страницы
+результатов и кэшируются для пары (пост, запрос).
+
+Подсказки при наборе запроса (suggest) ищут названия постов и теги по
+триграммам (pg_trgm, GIN индексы на Post.title и BlogTag.name) - находят
+и начало слова, и слово с опечаткой. Число строк и время запроса ограничены.
+"""
+import re
+from collections import namedtuple
+from functools import lru_cache, reduce
+from operator import and_
+
+from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank, TrigramWordSimilarity
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.db import OperationalError, connection, transaction
+from django.db.models import Count, F, Func, TextField, Value
+from django.urls import reverse
+
+from msdevblog.settings import SEARCH_HEADLINE_CACHE
+from msdevblog.utilites import detranslify
+from .caching import (SEARCH, SEARCH_TIMEOUT, SEARCH_HEADLINE_TIMEOUT, get_or_compute, get_version, search_key,
+                      search_facets_key, search_headline_key)
+from .models import Post, BlogTag, TaggedBlog
+
+SEARCH_CONFIG = 'russian'    # удаление русских стоп слов и выделение основ слов
+SEARCH_MAX_RESULTS = 1000    # сколько найденных постов можно пролистать
+
+Facet = namedtuple('Facet', 'name slug count')
+
+HEADLINE_OPTIONS = {         # параметры ts_headline
+    'start_sel': '<mark>',
+    'stop_sel': '</mark>',
+    'min_words': 15,
+    'max_words': 35,
+    'max_fragments': 2,
+    'fragment_delimiter': ' ... ',
+}
+
+SUGGEST_MIN_LENGTH = 2       # подсказки для более коротких фрагментов не ищутся
+SUGGEST_MAX_LENGTH = 50      # более длинный фрагмент обрезается
+SUGGEST_LIMIT = 5            # не более стольких постов и стольких тегов в ответе
+SUGGEST_TIMEOUT = 200        # бюджет времени запросов подсказок, мс
+
+_LATIN_WORD_RE = re.compile(r"^[a-zA-Z'`]+$")
+
+
+@lru_cache(maxsize=4096)
+def word_variants(word):
+    """ Слово запроса и его вариант в кириллице, если слово набрано латиницей """
+    if _LATIN_WORD_RE.match(word):
+        russian = detranslify(word).lower()
+        if russian != word.lower():
+            return word, russian
+    return (word,)
+
+
+def build_search_query(searched):
+    """ SearchQuery для строки поиска с учетом транслитерации слов """
+    words = searched.split()
+    if not words:
+        return SearchQuery(searched, config=SEARCH_CONFIG)
+    return reduce(and_, (
+        reduce(lambda query, variant: query | SearchQuery(variant, config=SEARCH_CONFIG),
+               variants[1:], SearchQuery(variants[0], config=SEARCH_CONFIG))
+        for variants in map(word_variants, words)
+    ))
+
+
+def normalize_query(searched):
+    """ Строка поиска без лишних пробелов и в нижнем регистре - ключ кэша результатов """
+    return ' '.join(searched.split()).lower()
+
+
+def search_post_ids(searched):
+    """ Id опубликованных постов, найденных по нормализованной строке поиска, в порядке ранга """
+    def rank_posts():
+        search_query = build_search_query(searched)
+        return list(Post.published
+                    .annotate(rank=SearchRank(F('search_vector'), search_query))
+                    .filter(search_vector=search_query)
+                    .order_by('-rank', '-time_created')
+                    .values_list('pk', flat=True)[:SEARCH_MAX_RESULTS])
+
+    return get_or_compute(search_key(searched), rank_posts, SEARCH_TIMEOUT, version=get_version(SEARCH))
+
+
+def filter_post_ids(post_ids, cat=None, tag=None):
+    """ Оставляет из найденных id посты выбранной категории и тега, порядок по рангу сохраняется """
+    queryset = Post.objects.filter(pk__in=post_ids)
+    if cat:
+        queryset = queryset.filter(cat__slug=cat)
+    if tag:
+        queryset = queryset.filter(tags__slug=tag)
+    selected = set(queryset.values_list('pk', flat=True))
+    return [pk for pk in post_ids if pk in selected]
+
+
+def facet_counts(post_ids):
+    """
+    Число найденных постов по категориям и тегам: {'cat': [Facet, ...], 'tag': [Facet, ...]}.
+    Обе группировки выполняются одним запросом (UNION ALL).
+    """
+    categories = Post.objects.filter(pk__in=post_ids).order_by() \
+        .values(facet=Value('cat'), facet_name=F('cat__title'), facet_slug=F('cat__slug')) \
+        .annotate(count=Count('pk'))
+    tags = TaggedBlog.objects.filter(object_id__in=post_ids, content_type=ContentType.objects.get_for_model(Post)) \
+        .order_by() \
+        .values(facet=Value('tag'), facet_name=F('tag__name'), facet_slug=F('tag__slug')) \
+        .annotate(count=Count('pk'))
+
+    facets = {'cat': [], 'tag': []}
+    if post_ids:
+        for row in categories.union(tags, all=True).order_by('-count', 'facet_name'):
+            facets[row['facet']].append(Facet(row['facet_name'], row['facet_slug'], row['count']))
+    return facets
+
+
+def search_results(searched, cat=None, tag=None):
+    """ Id найденных постов выбранной категории и тега в порядке ранга и счетчики фильтров """
+    def compute():
+        post_ids = search_post_ids(searched)
+        if cat or tag:
+            post_ids = filter_post_ids(post_ids, cat, tag)
+        return post_ids, facet_counts(post_ids)
+
+    return get_or_compute(search_facets_key(searched, cat, tag), compute, SEARCH_TIMEOUT,
+                          version=get_version(SEARCH))
+
+
+def _plain_body():
+    """ Текст поста без html тегов, иначе теги попадут во фрагменты и разорвут разметку """
+    return Func(F('body'), Value('<[^>]+>'), Value(' '), Value('g'),
+                function='regexp_replace', output_field=TextField())
+
+
+def add_headlines(posts, searched):
+    """
+    Добавляет постам текущей страницы атрибут headline - фрагменты текста с найденными словами.
+    Фрагменты, которых нет в кэше, рассчитываются одним запросом.
+    """
+    keys = {search_headline_key(post.pk, post.time_updated, searched): post for post in posts}
+    headlines = cache.get_many(keys) if SEARCH_HEADLINE_CACHE else {}
+
+    missing = {post.pk: key for key, post in keys.items() if key not in headlines}
+    if missing:
+        search_query = build_search_query(searched)
+        computed = dict(Post.objects.filter(pk__in=missing)
+                        .annotate(headline=SearchHeadline(_plain_body(), search_query, config=SEARCH_CONFIG,
+                                                          **HEADLINE_OPTIONS))
+                        .values_list('pk', 'headline'))
+        computed = {missing[pk]: headline for pk, headline in computed.items()}
+        if SEARCH_HEADLINE_CACHE:
+            cache.set_many(computed, SEARCH_HEADLINE_TIMEOUT)
+        headlines.update(computed)
+
+    for key, post in keys.items():
+        post.headline = headlines.get(key, '')
+    return posts
+
+
+def suggest(fragment):
+    """
+    Подсказки для начала или фрагмента (в т.ч. с опечаткой) строки поиска:
+    {'posts': [{'title', 'url'}, ...], 'tags': [{'name', 'url'}, ...]}.
+    Если запросы не уложились в SUGGEST_TIMEOUT - подсказок нет.
+    """
+    fragment = normalize_query(fragment)[:SUGGEST_MAX_LENGTH]
+    suggestions = {'posts': [], 'tags': []}
+    if len(fragment) < SUGGEST_MIN_LENGTH:
+        return suggestions
+
+    try:
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                # долгий запрос прерывается сервером БД, прежнее значение восстанавливаем ниже
+                # (при ошибке его вернет откат транзакции)
+                cursor.execute("SELECT current_setting('statement_timeout'), "
+                               "set_config('statement_timeout', %s, true)", [str(SUGGEST_TIMEOUT)])
+                statement_timeout = cursor.fetchone()[0]
+            # оператор %> (trigram_word_similar) использует триграммный индекс
+            posts = Post.published.filter(title__trigram_word_similar=fragment) \
+                .annotate(similarity=TrigramWordSimilarity(fragment, 'title')) \
+                .order_by('-similarity', '-time_created') \
+                .values_list('title', 'slug')[:SUGGEST_LIMIT]
+            tags = BlogTag.objects.filter(name__trigram_word_similar=fragment, published_count__gt=0) \
+                .annotate(similarity=TrigramWordSimilarity(fragment, 'name')) \
+                .order_by('-similarity', '-published_count') \
+                .values_list('name', 'slug')[:SUGGEST_LIMIT]
+            suggestions['posts'] = [{'title': title, 'url': reverse('blog:post-detail', args=[slug])}
+                                    for title, slug in posts]
+            suggestions['tags'] = [{'name': name, 'url': reverse('blog:tag', args=[slug])}
+                                   for name, slug in tags]
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT set_config('statement_timeout', %s, true)", [statement_timeout])
+    except OperationalError:    # превышен statement_timeout
+        suggestions = {'posts': [], 'tags': []}
+    return suggestions
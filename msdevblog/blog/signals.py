@@ -0,0 +1,209 @@
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from .caching import (SIDEBAR, SEARCH, PAGES, bump_version, invalidate_post_article, invalidate_post_comments,
+                      invalidate_sitemap, invalidate_feeds)
+from .models import Post, Category, Comment, BlogTag, TaggedBlog, update_tags_cache, update_tag_counts
+from .sitemaps import PostSitemap
+from .tasks import prerender_files
+
+
+# поля профиля, которые выводятся на страницах постов
+AUTHOR_FIELDS = {'username', 'first_name', 'last_name', 'bio', 'git'}
+
+
+def _is_post(tagged_item):
+    return tagged_item.content_type_id == ContentType.objects.get_for_model(Post).id
+
+
+def _invalidate_posts(post_ids):
+    """ Сбрасывает кэш страниц постов с указанными id """
+    for post_id, slug, time_updated in Post.objects.filter(pk__in=post_ids).values_list('pk', 'slug', 'time_updated'):
+        invalidate_post_article(post_id, slug, time_updated)
+
+
+def _invalidate_post_feeds(post_ids):
+    """ Сбрасывает ленты, в которые входят посты с указанными id """
+    categories, tags = set(), set()
+    for category, tags_cache in Post.objects.filter(pk__in=post_ids).values_list('cat__slug', 'tags_cache'):
+        categories.add(category)
+        tags.update(tag['slug'] for tag in tags_cache)
+    invalidate_feeds(categories, tags)
+
+
+@receiver(pre_save, sender=Post)
+def post_changing(sender, instance, **kwargs):
+    """
+    Пост изменяется - запоминаем прежние slug, время изменения, категорию и теги:
+    кэш по ним сбрасывается после записи (post_saved)
+    """
+    instance._cached_state = None
+    if instance.pk:
+        instance._cached_state = Post.objects.filter(pk=instance.pk) \
+            .values('slug', 'time_updated', 'cat__slug', 'tags_cache', 'status').first()
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, **kwargs):
+    """
+    Мог измениться статус поста - пересчитываем облако для его тегов.
+    После коммита сбрасываем кэш страницы по прежним slug и времени изменения и ленты прежних
+    и новых категории и тегов: сброс до коммита позволил бы параллельному запросу
+    снова закэшировать прежние данные.
+    """
+    update_tag_counts(TaggedBlog.objects.filter(object_id=instance.pk,
+                                                content_type=ContentType.objects.get_for_model(Post))
+                      .values('tag_id'))
+    state = getattr(instance, '_cached_state', None)
+
+    def invalidate():
+        if state:
+            invalidate_post_article(instance.pk, state['slug'], state['time_updated'])
+            invalidate_feeds([state['cat__slug']], [tag['slug'] for tag in state['tags_cache']])
+        _invalidate_posts([instance.pk])
+        _invalidate_post_feeds([instance.pk])
+
+    transaction.on_commit(invalidate, robust=True)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    """ Пост удален - после коммита сбрасываем кэш его страницы, комментариев и лент """
+    # связи с тегами уже удалены, теги поста берем из снимка
+    update_tag_counts(BlogTag.objects.filter(slug__in=[tag['slug'] for tag in instance.tags_cache]).values('pk'))
+    post_id, slug, time_updated = instance.pk, instance.slug, instance.time_updated
+    categories = list(Category.objects.filter(pk=instance.cat_id).values_list('slug', flat=True))
+    tags = [tag['slug'] for tag in instance.tags_cache]
+
+    def invalidate():
+        invalidate_post_article(post_id, slug, time_updated)
+        invalidate_post_comments(post_id)
+        invalidate_feeds(categories, tags)
+
+    transaction.on_commit(invalidate, robust=True)
+
+
+@receiver([post_save, post_delete], sender=Post)
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=BlogTag)
+@receiver([post_save, post_delete], sender=TaggedBlog)
+def sidebar_changed(sender, **kwargs):
+    """
+    Изменились данные боковой панели (категории, новые посты, теги) - сбрасываем ее после коммита,
+    до коммита параллельный запрос закэшировал бы прежнюю панель под новой версией
+    """
+    transaction.on_commit(lambda: bump_version(SIDEBAR), robust=True)
+
+
+@receiver([post_save, post_delete], sender=Post)
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=BlogTag)
+@receiver([post_save, post_delete], sender=TaggedBlog)
+def search_changed(sender, **kwargs):
+    """
+    Изменились посты, категории или теги - кэшированные результаты поиска и фильтров устарели.
+    Сброс после коммита: к этому времени записан и поисковый вектор поста (Post.save).
+    """
+    transaction.on_commit(lambda: bump_version(SEARCH), robust=True)
+
+
+@receiver([post_save, post_delete], sender=Post)
+def sitemap_changed(sender, instance, **kwargs):
+    """
+    Сбрасываем страницу карты сайта с постом. Публикация, снятие с публикации или удаление
+    сдвигает следующие посты, поэтому сбрасываем и все следующие страницы.
+    Сброс после коммита: до него запрос поисковика снова закэшировал бы прежнюю страницу.
+    """
+    def invalidate():
+        sitemap = PostSitemap()
+        invalidate_sitemap('posts', sitemap.page_of(instance.pk), sitemap.num_pages() + 1)
+
+    transaction.on_commit(invalidate, robust=True)
+
+
+@receiver([post_save, post_delete], sender=Post)
+def post_prerender(sender, instance, **kwargs):
+    """
+    Опубликованный пост сохранен, удален или снят с публикации - после коммита
+    перерисовываем в Celery его ленты (прежние и новые категория и теги) и карту сайта
+    """
+    state = getattr(instance, '_cached_state', None)
+    was_published = bool(state) and state['status'] == Post.Status.PUBLISHED
+    if instance.status != Post.Status.PUBLISHED and not was_published:
+        return
+    categories = set(Category.objects.filter(pk=instance.cat_id).values_list('slug', flat=True))
+    tags = {tag['slug'] for tag in instance.tags_cache}
+    if state:
+        categories.add(state['cat__slug'])
+        tags.update(tag['slug'] for tag in state['tags_cache'])
+    categories, tags = sorted(categories), sorted(tags)
+    page = PostSitemap().page_of(instance.pk)
+    transaction.on_commit(lambda: prerender_files.delay(categories, tags, page), robust=True)
+
+
+@receiver([post_save, post_delete], sender=Post)
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=BlogTag)
+@receiver([post_save, post_delete], sender=TaggedBlog)
+@receiver([post_save, post_delete], sender=Comment)
+def pages_changed(sender, **kwargs):
+    """
+    Изменились данные страниц блога - после коммита сбрасываем кэш страниц для анонимных читателей
+    (до коммита параллельный запрос снова закэшировал бы прежнюю страницу)
+    """
+    transaction.on_commit(lambda: bump_version(PAGES), robust=True)
+
+
+@receiver([post_save, post_delete], sender=Comment)
+def comment_changed(sender, instance, **kwargs):
+    """ После коммита сбрасываем отрисованные комментарии поста """
+    transaction.on_commit(lambda: invalidate_post_comments(instance.post_id), robust=True)
+
+
+@receiver([post_save, post_delete], sender=TaggedBlog)
+def tagged_item_changed(sender, instance, **kwargs):
+    """ Тег добавлен к посту или удален (в т.ч. каскадно при удалении самого тега) """
+    if _is_post(instance):
+        update_tags_cache([instance.object_id])
+        update_tag_counts([instance.tag_id])
+        transaction.on_commit(lambda: _invalidate_posts([instance.object_id]), robust=True)
+        tags = list(BlogTag.objects.filter(pk=instance.tag_id).values_list('slug', flat=True))
+        transaction.on_commit(lambda: invalidate_feeds(tag_slugs=tags), robust=True)
+        if Post.published.filter(pk=instance.object_id).exists():
+            transaction.on_commit(lambda: prerender_files.delay(tag_slugs=tags, latest=False), robust=True)
+
+
+@receiver(post_save, sender=BlogTag)
+def tag_changed(sender, instance, created, **kwargs):
+    """ Тег переименован - обновляем снимок тегов у всех постов с этим тегом """
+    if not created:
+        post_ids = TaggedBlog.objects.filter(tag=instance).values('object_id')
+        update_tags_cache(post_ids)
+        transaction.on_commit(lambda: _invalidate_posts(post_ids), robust=True)
+        transaction.on_commit(lambda: invalidate_feeds(tag_slugs=[instance.slug]), robust=True)
+
+
+@receiver(post_save, sender=Category)
+def category_changed(sender, instance, **kwargs):
+    """ Изменилось название категории - после коммита сбрасываем ее ленту """
+    transaction.on_commit(lambda: invalidate_feeds([instance.slug]), robust=True)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def author_changed(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Изменился профиль автора - сбрасываем отрисованные тексты его постов (в них имя, bio, git),
+    кэш страниц для анонимных читателей и ETag списков постов (в них имя автора, blog.views.list_etag)
+    """
+    if created or (update_fields is not None and not AUTHOR_FIELDS & set(update_fields)):
+        return      # например, вход на сайт обновляет только last_login
+
+    def invalidate():
+        _invalidate_posts(Post.objects.filter(user_id=instance.pk).values('pk'))
+        bump_version(PAGES)
+        bump_version(SIDEBAR)
+
+    transaction.on_commit(invalidate, robust=True)
@@ -1,13 +1,55 @@
 from django.contrib.sitemaps import Sitemap
+from django.core.paginator import Paginator, Page
+from django.db.models import Max
+
 from .models import Post
 
 
+class IteratorPage(Page):
+    """ Страница, записи которой читаются курсором на стороне сервера БД, а не загружаются списком """
+    def __init__(self, object_list, number, paginator):
+        super().__init__(object_list.iterator(chunk_size=paginator.chunk_size), number, paginator)
+
+
+class IteratorPaginator(Paginator):
+    chunk_size = 500
+
+    def _get_page(self, *args, **kwargs):
+        return IteratorPage(*args, **kwargs)
+
+
 class PostSitemap(Sitemap):
+    """
+    Карта сайта постов, разбитая на страницы по limit постов (индекс - /sitemap.xml,
+    страницы - /sitemap-posts.xml?p=N). Посты упорядочены по id, поэтому новый пост
+    попадает на последнюю страницу, а изменение поста меняет только его страницу.
+    """
     changefreq = 'weekly'
     priority = 0.9
+    limit = 5000
 
     def items(self):
-        return Post.published.all()
+        return Post.published.only('slug', 'time_updated').order_by('id')
 
     def lastmod(self, obj):
         return obj.time_updated
+
+    @property
+    def paginator(self):
+        return IteratorPaginator(self.items(), self.limit)
+
+    def get_latest_lastmod(self):
+        # без загрузки всех постов, как в реализации по умолчанию
+        return Post.published.aggregate(Max('time_updated'))['time_updated__max']
+
+    def page_of(self, post_id):
+        """ Номер страницы карты сайта с постом post_id (и куда он попадет при публикации) """
+        return Post.published.filter(id__lt=post_id).count() // self.limit + 1
+
+    def num_pages(self):
+        return self.paginator.num_pages
+
+
+SITEMAPS = {
+    'posts': PostSitemap,
+}
@@ -1,9 +1,109 @@
+import os
+from glob import glob
+from urllib.parse import quote
+
+from django.contrib.sites.models import Site
 from django.core.mail import send_mail
+from django.db.models import Q
+from django.http import Http404, HttpRequest
+from django.urls import reverse
 
 from celery import shared_task
 
+from msdevblog.settings import PRERENDER_ROOT
+from .feeds import LatestPostsFeed, CategoryPostsFeed, TagPostsFeed
+from .images import make_variants
+from .models import Post, Category, BlogTag, UploadedImage
+from .sitemaps import SITEMAPS
+from .utils import write_atomic
+
 
 @shared_task
 def send_feedback_mail(subject: str, message: str, from_email: str, recipient_list: list | tuple):
     """ Отправляет сообщение, обертка над 'send_mail' с целью использования в Celery """
     return send_mail(subject=subject, message=message, from_email=from_email, recipient_list=recipient_list)
+
+
+def _prerender_request(**params):
+    """ Запрос для отрисовки лент и карты сайта вне веб-сервера, адрес сайта берется из Site """
+    request = HttpRequest()
+    request.method = 'GET'
+    request.META['HTTP_HOST'] = Site.objects.get_current().domain
+    request.GET.update(params)
+    return request
+
+
+def _write_feed(feed, url_name, slug=None):
+    kwargs = {'slug': slug} if slug else {}
+    file_path = os.path.join(PRERENDER_ROOT, reverse(url_name, kwargs=kwargs).lstrip('/'), 'index.xml')
+    try:
+        response = feed(_prerender_request(), **kwargs)
+    except Http404:     # категория или тег удалены
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        return
+    write_atomic(file_path, response.content)
+
+
+def _write_sitemaps(first_page=1):
+    """ Индекс карты сайта и страницы разделов, начиная с first_page """
+    from .views import sitemap_index, sitemap_section   # views импортируют tasks
+
+    write_atomic(os.path.join(PRERENDER_ROOT, 'sitemap.xml'), sitemap_index(_prerender_request()).content)
+    for section, sitemap in SITEMAPS.items():
+        num_pages = sitemap().num_pages()
+        for page in range(first_page, num_pages + 1):
+            response = sitemap_section(_prerender_request(p=str(page)), section)
+            write_atomic(os.path.join(PRERENDER_ROOT, f'sitemap-{section}-{page}.xml'), response.content)
+        # страниц стало меньше (посты сняты с публикации)
+        for file_path in glob(os.path.join(PRERENDER_ROOT, f'sitemap-{section}-*.xml')):
+            page = os.path.basename(file_path)[len(f'sitemap-{section}-'):-len('.xml')]
+            if page.isdigit() and int(page) > num_pages:
+                os.remove(file_path)
+
+
+@shared_task
+def prerender_feeds_and_sitemaps():
+    """
+    По расписанию (CELERY_BEAT_SCHEDULE) отрисовывает в PRERENDER_ROOT все RSS ленты и карту сайта.
+    Отрисовка идет через кэш (blog/caching.py), поэтому неизмененные ленты не запрашивают БД.
+    """
+    _write_feed(LatestPostsFeed(), 'blog:post-feed')
+    for slug in Category.objects.filter(posts__status=Post.Status.PUBLISHED).distinct() \
+            .values_list('slug', flat=True):
+        _write_feed(CategoryPostsFeed(), 'blog:category-feed', slug)
+    for slug in BlogTag.objects.filter(published_count__gt=0).values_list('slug', flat=True):
+        _write_feed(TagPostsFeed(), 'blog:tag-feed', slug)
+    _write_sitemaps()
+
+
+@shared_task
+def prerender_files(category_slugs: list = (), tag_slugs: list = (), sitemap_page: int | None = None,
+                    latest: bool = True):
+    """
+    После изменения опубликованного поста отрисовывает только затронутые файлы (blog/signals.py):
+    общую ленту, ленты категорий и тегов поста и страницы карты сайта начиная с sitemap_page.
+    """
+    if latest:
+        _write_feed(LatestPostsFeed(), 'blog:post-feed')
+    for slug in category_slugs:
+        _write_feed(CategoryPostsFeed(), 'blog:category-feed', slug)
+    for slug in tag_slugs:
+        _write_feed(TagPostsFeed(), 'blog:tag-feed', slug)
+    if sitemap_page is not None:
+        _write_sitemaps(sitemap_page)
+
+
+@shared_task
+def make_image_variants(name: str):
+    """
+    После загрузки изображения в редакторе (CkeditorCustomStorage) сохраняет его уменьшенные копии
+    и пересчитывает html постов, уже ссылающихся на изображение.
+    """
+    width, height, variants = make_variants(name)
+    UploadedImage.objects.update_or_create(name=name, defaults={'width': width, 'height': height,
+                                                                'variants': variants})
+    for post in Post.objects.filter(Q(body__contains=name) | Q(body__contains=quote(name))):
+        post.update_body_html()
+        # time_updated меняется вместе с html, чтобы сбросить ETag и кэш страницы поста
+        post.save(update_fields=['body_html', 'time_updated'])
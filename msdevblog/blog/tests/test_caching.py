@@ -0,0 +1,119 @@
+from threading import Thread
+from time import sleep, time
+
+from django.core.cache import cache
+from django.core.cache.backends.redis import RedisSerializer
+from django.test import TestCase
+
+from unittest.mock import Mock, patch
+
+from blog.caching import CompressedRedisSerializer, SIDEBAR, bump_version, get_version, get_or_compute
+from blog.middlewares import sidebar
+from blog.models import Category
+
+
+class CompressedRedisSerializerTestCase(TestCase):  # python manage.py test blog.tests.test_caching
+    serializer = CompressedRedisSerializer()
+
+    def test_int(self):
+        self.assertEqual(self.serializer.dumps(42), 42)
+        self.assertEqual(self.serializer.loads(b'42'), 42)
+
+    def test_small_value(self):
+        value = {'title': 'Название поста'}
+        data = self.serializer.dumps(value)
+        self.assertEqual(data, RedisSerializer().dumps(value))  # не сжимается
+        self.assertEqual(self.serializer.loads(data), value)
+
+    def test_large_value(self):
+        value = [{'title': f'Название поста {x}', 'slug': f'nazvanie-posta-{x}'} for x in range(100)]
+        data = self.serializer.dumps(value)
+        self.assertLess(len(data), len(RedisSerializer().dumps(value)))
+        self.assertEqual(self.serializer.loads(data), value)
+
+
+class VersionTestCase(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+
+    def test_bump_version(self):
+        version = get_version(SIDEBAR)
+        self.assertEqual(get_version(SIDEBAR), version)
+        self.assertEqual(bump_version(SIDEBAR), version + 1)
+        self.assertEqual(get_version(SIDEBAR), version + 1)
+
+    def test_bump_version_missing_key(self):
+        self.assertTrue(bump_version(SIDEBAR))
+        self.assertEqual(get_version(SIDEBAR), bump_version(SIDEBAR) - 1)
+
+    def test_sidebar_fresh_after_write(self):
+        """ Новая категория видна сразу, без ожидания истечения кэша. """
+        self.assertFalse(list(sidebar(None)['categories']))
+        version = get_version(SIDEBAR)
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.create(title='Новая категория', slug='new-category')
+            # до коммита версия прежняя: параллельный запрос не закэширует старую панель под новой версией
+            self.assertEqual(get_version(SIDEBAR), version)
+        self.assertEqual(sidebar(None)['categories'][0].slug, 'new-category')
+
+
+class GetOrComputeTestCase(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+
+    def test_compute_once(self):
+        compute = Mock(return_value=[1, 2, 3])
+        for _ in range(5):
+            self.assertEqual(get_or_compute('key', compute, 300), [1, 2, 3])
+        compute.assert_called_once()
+
+    def test_expired_locked_returns_stale(self):
+        """ Пока значение пересчитывает другой процесс, отдается прежнее значение. """
+        cache.set('key', ('stale', 0.1, time() - 1), 300)
+        cache.add('key:lock', 1)
+        compute = Mock(return_value='fresh')
+        self.assertEqual(get_or_compute('key', compute, 300), 'stale')
+        compute.assert_not_called()
+
+    def test_expired_recompute(self):
+        cache.set('key', ('stale', 0.1, time() - 1), 300)
+        self.assertEqual(get_or_compute('key', Mock(return_value='fresh'), 300), 'fresh')
+        self.assertIsNone(cache.get('key:lock'))
+
+    def test_missing_locked_waits_for_value(self):
+        """ Значения нет, его пересчитывает другой процесс - ждем его результат, а не считаем сами. """
+        cache.add('key:lock', 1)
+
+        def other_process():
+            sleep(0.2)
+            cache.set('key', ('fresh', 0.2, time() + 300), 600)
+            cache.delete('key:lock')
+
+        thread = Thread(target=other_process)
+        thread.start()
+        compute = Mock(return_value='own')
+        self.assertEqual(get_or_compute('key', compute, 300), 'fresh')
+        thread.join()
+        compute.assert_not_called()
+
+    def test_stale_kept_after_expiry(self):
+        """ Значение хранится дольше срока актуальности, чтобы было что отдать во время пересчета. """
+        with patch.object(cache, 'set', wraps=cache.set) as cache_set:
+            get_or_compute('key', Mock(return_value='value'), 300)
+        self.assertGreater(cache_set.call_args.args[2], 300)
+
+    def test_concurrent_slow_compute_once(self):
+        """ Медленный пересчет при одновременных запросах выполняется ровно один раз. """
+        def slow():
+            sleep(0.7)
+            return 'value'
+
+        compute = Mock(side_effect=slow)
+        results = []
+        threads = [Thread(target=lambda: results.append(get_or_compute('key', compute, 300))) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, ['value'] * 8)
+        compute.assert_called_once()
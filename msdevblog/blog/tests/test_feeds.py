@@ -0,0 +1,107 @@
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.conf import settings
+from django.core.cache import cache
+from django.urls import reverse
+
+from blog.models import Category, Post
+
+
+class FeedsTestCase(TestCase):   # python manage.py test blog.tests.test_feeds
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        settings.SECRET_KEY = "some_test_secret_key!"
+        cls.user = get_user_model().objects.create_user(username='test_user',
+                                                        email='test_user@mail.ru',
+                                                        password='test_user_password')
+        cls.category = Category.objects.create(title='Тест категории', slug='test-category')
+        cls.other_category = Category.objects.create(title='Другая категория', slug='other-category')
+        cls.post = Post.objects.create(
+            user=cls.user,
+            cat=cls.category,
+            title='Пост ленты',
+            slug='feed-post',
+            body='Текст поста',
+            status='PB'
+        )
+        cls.post.tags.add('python')
+        cls.other_post = Post.objects.create(
+            user=cls.user,
+            cat=cls.other_category,
+            title='Пост другой ленты',
+            slug='other-feed-post',
+            body='Текст поста',
+            status='PB'
+        )
+
+    def setUp(self) -> None:
+        cache.clear()
+        patcher = patch('blog.signals.prerender_files')     # отрисовка файлов в Celery после коммита
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_latest_feed(self):
+        response = self.client.get(reverse('blog:post-feed'))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Пост ленты')
+        self.assertContains(response, 'Пост другой ленты')
+        self.assertTrue(response.has_header('ETag'))
+        self.assertTrue(response.has_header('Last-Modified'))
+
+    def test_section_feeds(self):
+        response = self.client.get(reverse('blog:category-feed', args=['test-category']))
+        self.assertContains(response, 'Пост ленты')
+        self.assertNotContains(response, 'Пост другой ленты')
+        response = self.client.get(reverse('blog:tag-feed', args=['python']))
+        self.assertContains(response, 'Пост ленты')
+        self.assertNotContains(response, 'Пост другой ленты')
+        self.assertNotEqual(response.headers['ETag'],
+                            self.client.get(reverse('blog:post-feed')).headers['ETag'])
+
+    def test_feed_not_modified(self):
+        """ Повторный опрос ленты получает 304 без запросов к БД. """
+        url = reverse('blog:category-feed', args=['test-category'])
+        response = self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            etag_response = self.client.get(url, HTTP_IF_NONE_MATCH=response.headers['ETag'])
+            date_response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=response.headers['Last-Modified'])
+        self.assertEqual(etag_response.status_code, 304)
+        self.assertEqual(date_response.status_code, 304)
+        self.assertEqual(len(queries), 0)
+
+    def test_feed_invalidation(self):
+        """ Изменение поста сбрасывает ленты его категории и тегов, но не другие. """
+        url = reverse('blog:tag-feed', args=['python'])
+        etag = self.client.get(url).headers['ETag']
+        self.client.get(reverse('blog:category-feed', args=['other-category']))
+
+        post = Post.objects.get(pk=self.post.pk)
+        post.title = 'Новое название поста'
+        with self.captureOnCommitCallbacks(execute=True):   # кэш сбрасывается после коммита
+            post.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Новое название поста')
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('blog:category-feed', args=['other-category']))
+        self.assertEqual(len(queries), 0)
+
+    def test_feed_older_post_removed(self):
+        """ Удаление из ленты не самого нового поста меняет ETag. """
+        other_post = Post.objects.get(pk=self.other_post.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            other_post.tags.add('python')
+        url = reverse('blog:tag-feed', args=['python'])
+        etag = self.client.get(url).headers['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Post.objects.get(pk=self.post.pk).tags.remove('python')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, 'Пост ленты<')
+        self.assertContains(response, 'Пост другой ленты')
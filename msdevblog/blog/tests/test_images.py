@@ -0,0 +1,232 @@
+import os
+from io import BytesIO, StringIO
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.conf import settings
+from PIL import Image
+
+from blog.images import make_variants, render_images, upload_names
+from blog.models import Category, Post, UploadedImage
+from blog.tasks import make_image_variants
+from blog.utils import CkeditorCustomStorage
+
+
+def image_file(width, height, image_format='JPEG', color='red'):
+    buffer = BytesIO()
+    Image.new('RGB', (width, height), color).save(buffer, image_format)
+    return ContentFile(buffer.getvalue())
+
+
+class ImagesTestCase(TestCase):   # python manage.py test blog.tests.test_images
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        settings.SECRET_KEY = "some_test_secret_key!"
+        cls.user = get_user_model().objects.create_user(username='test_user',
+                                                        email='test_user@mail.ru',
+                                                        password='test_user_password')
+        cls.category = Category.objects.create(title='Тест категории', slug='test-category')
+
+    def setUp(self) -> None:
+        cache.clear()
+        tmp_dir = TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.root = tmp_dir.name
+        patcher = patch.object(CkeditorCustomStorage, 'location', self.root)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def upload(self, name, content):
+        with self.captureOnCommitCallbacks() as callbacks:
+            name = CkeditorCustomStorage().save(name, content)
+        return name, callbacks
+
+    def test_upload_enqueues_variants(self):
+        with patch('blog.tasks.make_image_variants.delay') as delay:
+            name, callbacks = self.upload('photo.jpg', image_file(100, 50))
+            for callback in callbacks:
+                callback()
+        delay.assert_called_once_with(name)
+
+        with patch('blog.tasks.make_image_variants.delay') as delay:
+            _, callbacks = self.upload('file.txt', ContentFile(b'text'))
+            for callback in callbacks:
+                callback()
+        delay.assert_not_called()
+
+    def test_make_variants(self):
+        name, _ = self.upload('photo.jpg', image_file(1000, 500))
+        width, height, variants = make_variants(name)
+        self.assertEqual((width, height), (1000, 500))
+        self.assertEqual([variant['width'] for variant in variants], [480, 600, 1000])
+        self.assertEqual(variants[-1]['fallback'], name)    # исходная ширина - сам оригинал
+        for variant in variants:
+            with Image.open(os.path.join(self.root, variant['webp'])) as image:
+                self.assertEqual(image.format, 'WEBP')
+                self.assertEqual(image.width, variant['width'])
+            with Image.open(os.path.join(self.root, variant['fallback'])) as image:
+                self.assertEqual(image.format, 'JPEG')
+                self.assertEqual(image.width, variant['width'])
+
+    def test_small_image(self):
+        name, _ = self.upload('icon.png', image_file(100, 100, 'PNG'))
+        _, _, variants = make_variants(name)
+        self.assertEqual(len(variants), 1)
+        self.assertTrue(variants[0]['webp'].endswith('-100w.webp'))
+        self.assertEqual(variants[0]['fallback'], name)
+
+    def test_webp_fallback(self):
+        name, _ = self.upload('photo.webp', image_file(800, 400, 'WEBP'))
+        _, _, variants = make_variants(name)
+        self.assertEqual([variant['width'] for variant in variants], [480, 600, 800])
+        for variant in variants:    # браузеры без WebP получают только JPEG
+            self.assertTrue(variant['fallback'].endswith('.jpg'))
+            with Image.open(os.path.join(self.root, variant['fallback'])) as image:
+                self.assertEqual(image.format, 'JPEG')
+                self.assertEqual(image.width, variant['width'])
+
+    def test_render_images(self):
+        image = UploadedImage(name='2026/10/18/a b.jpg', width=1000, height=500, variants=[
+            {'width': 480, 'webp': '2026/10/18/a b-480w.webp', 'fallback': '2026/10/18/a b-480w.jpg'},
+            {'width': 1000, 'webp': '2026/10/18/a b-1000w.webp', 'fallback': '2026/10/18/a b.jpg'},
+        ])
+        src = f'{CkeditorCustomStorage.base_url}2026/10/18/a%20b.jpg'
+        html = f'<p><img src="{src}" alt="a"><img src="/other.jpg"><img src="/third.jpg" loading="eager"></p>'
+        self.assertEqual(upload_names(html), {image.name})
+        result = render_images(html, {image.name: image})
+        self.assertIn('<picture><source type="image/webp" srcset="'
+                      f'{CkeditorCustomStorage.base_url}2026/10/18/a%20b-480w.webp 480w, ', result)
+        self.assertIn(f'<img src="{src}" alt="a" width="1000" height="500" fetchpriority="high" '
+                      'decoding="async" srcset="', result)
+        self.assertIn('<img src="/other.jpg" loading="lazy" decoding="async">', result)
+        self.assertIn('<img src="/third.jpg" loading="eager" decoding="async">', result)   # задано автором
+        self.assertEqual(result.count('<picture>'), 1)
+        self.assertEqual(render_images(result, {image.name: image}), result)    # повторная обработка не меняет html
+
+        result = render_images(html, {})
+        self.assertNotIn('<picture>', result)
+        self.assertNotIn('width=', result)
+
+    def test_task_rewrites_posts(self):
+        name, _ = self.upload('photo.jpg', image_file(1000, 500))
+        body = f'<p><img src="{CkeditorCustomStorage.base_url}{name}"></p>'
+        post = Post.objects.create(user=self.user, cat=self.category, title='Пост с фото', body=body)
+        self.assertNotIn('<picture>', post.body_html)  # копий еще нет
+
+        time_updated = post.time_updated
+        make_image_variants(name)
+        post.refresh_from_db()
+        self.assertIn('<picture>', post.body_html)
+        self.assertIn('-480w.webp 480w', post.body_html)
+        self.assertEqual(post.body, body)
+        self.assertGreater(post.time_updated, time_updated)
+
+        # новый пост с уже обработанным изображением получает srcset при сохранении
+        other = Post.objects.create(user=self.user, cat=self.category, title='Еще пост', body=body)
+        self.assertEqual(other.body_html, post.body_html)
+
+    def test_content_addressed_dedup(self):
+        with patch('blog.tasks.make_image_variants.delay') as delay:
+            first, callbacks = self.upload('photo.jpg', image_file(100, 50))
+            for callback in callbacks:
+                callback()
+            second, callbacks = self.upload('copy.JPG', image_file(100, 50))
+            for callback in callbacks:
+                callback()
+        self.assertEqual(first, second)
+        self.assertRegex(first, r'^[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.jpg$')
+        # копий еще нет (задача не выполнилась) - повторная загрузка снова ставит задачу
+        self.assertEqual(delay.call_count, 2)
+        files = [file for _, _, files in os.walk(self.root) for file in files]
+        self.assertEqual(len(files), 1)
+
+        make_image_variants(first)
+        with patch('blog.tasks.make_image_variants.delay') as delay:
+            _, callbacks = self.upload('again.jpg', image_file(100, 50))
+            for callback in callbacks:
+                callback()
+        delay.assert_not_called()    # копии уже есть
+
+    def test_dedup_touches_file(self):
+        name, _ = self.upload('photo.jpg', image_file(100, 50))
+        path = os.path.join(self.root, name)
+        os.utime(path, (0, 0))     # давно загруженный файл, не используемый постами
+        self.upload('copy.jpg', image_file(100, 50))
+        call_command('gc_uploads', stdout=StringIO())
+        self.assertTrue(os.path.exists(path))
+
+    @patch.object(CkeditorCustomStorage, 'content_addressed', False)
+    def test_dated_folders(self):
+        name, _ = self.upload('photo.jpg', image_file(100, 50))
+        self.assertRegex(name, r'^\d{4}/\d{2}/\d{2}/photo\.jpg$')
+
+    def test_gc_uploads(self):
+        used, _ = self.upload('used.jpg', image_file(1000, 500))
+        unused, _ = self.upload('unused.jpg', image_file(1000, 500, color='blue'))
+        make_image_variants(used)
+        make_image_variants(unused)
+        Post.objects.create(user=self.user, cat=self.category, title='Пост с фото',
+                            body=f'<img src="{CkeditorCustomStorage.base_url}{used}">')
+        variants = UploadedImage.objects.get(name=used).variants
+
+        out = StringIO()
+        call_command('gc_uploads', '--dry-run', '--min-age', '0', stdout=out)
+        self.assertIn(unused, out.getvalue())
+        self.assertTrue(os.path.exists(os.path.join(self.root, unused)))
+
+        call_command('gc_uploads', '--min-age', '0', stdout=StringIO())
+        self.assertFalse(os.path.exists(os.path.join(self.root, unused)))
+        self.assertFalse(UploadedImage.objects.filter(name=unused).exists())
+        for name in [used, *(variant['webp'] for variant in variants)]:
+            self.assertTrue(os.path.exists(os.path.join(self.root, name)))
+        files = [file for _, _, files in os.walk(self.root) for file in files]
+        self.assertEqual(len(files), 1 + 2 * len(variants) - 1)
+
+        # молодые файлы не удаляются
+        fresh, _ = self.upload('fresh.jpg', image_file(10, 10))
+        call_command('gc_uploads', stdout=StringIO())
+        self.assertTrue(os.path.exists(os.path.join(self.root, fresh)))
+
+    def test_gc_uploads_links(self):
+        """ Файлы, на которые ссылаются только <a href> или srcset, не удаляются. """
+        full, _ = self.upload('full.jpg', image_file(1000, 500))
+        thumb, _ = self.upload('thumb.jpg', image_file(100, 50, color='blue'))
+        retina, _ = self.upload('retina.jpg', image_file(200, 100, color='green'))
+        unused, _ = self.upload('unused.jpg', image_file(100, 50, color='white'))
+        base_url = CkeditorCustomStorage.base_url
+        Post.objects.create(user=self.user, cat=self.category, title='Пост с миниатюрой',
+                            body=f'<a href="https://example.com{base_url}{full}">'
+                                 f'<img src="/thumb.jpg" srcset="{base_url}{thumb} 1x, {base_url}{retina} 2x"></a>')
+
+        call_command('gc_uploads', '--min-age', '0', stdout=StringIO())
+        for name in (full, thumb, retina):
+            self.assertTrue(os.path.exists(os.path.join(self.root, name)))
+        self.assertFalse(os.path.exists(os.path.join(self.root, unused)))
+
+    def test_update_body_html(self):
+        post = Post.objects.create(user=self.user, cat=self.category, title='Пост', slug='body-html-post',
+                                   body='<img src="/a.jpg"><img src="/b.jpg">', status='PB')
+        Post.objects.filter(pk=post.pk).update(body_html='<p>Прежний html</p>')
+        url = reverse('blog:post-detail', args=['body-html-post'])
+        response = self.client.get(url)
+        self.assertContains(response, 'Прежний html')
+        etag = response.headers['ETag']
+
+        call_command('update_body_html', stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual(post.body_html, '<img src="/a.jpg" fetchpriority="high" decoding="async">'
+                                         '<img src="/b.jpg" loading="lazy" decoding="async">')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'loading="lazy"')
+
+        out = StringIO()
+        call_command('update_body_html', stdout=out)    # html не изменился - посты не обновляются
+        self.assertIn('Обновлено постов: 0', out.getvalue())
@@ -0,0 +1,75 @@
+import os
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
+
+from django.test import TestCase
+from django.utils.http import http_date
+
+from blog.media import IMMUTABLE_MAX_AGE
+
+HASHED_NAME = 'ab/cd/' + 'abcd' * 16 + '-480w.webp'
+
+
+class MediaTestCase(TestCase):   # python manage.py test blog.tests.test_media
+    def setUp(self) -> None:
+        tmp_dir = TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.root = tmp_dir.name
+        patcher = patch('blog.media.MEDIA_ROOT', self.root)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.content = bytes(range(256)) * 1024
+        for name in ('uploads/2026/10/18/photo.jpg', f'uploads/{HASHED_NAME}'):
+            os.makedirs(os.path.dirname(os.path.join(self.root, name)), exist_ok=True)
+            with open(os.path.join(self.root, name), 'wb') as file:
+                file.write(self.content)
+
+    def test_serve_chunked(self):
+        response = self.client.get('/media/uploads/2026/10/18/photo.jpg')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertEqual(response['Content-Length'], str(len(self.content)))
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertNotIn('immutable', response['Cache-Control'])
+        chunks = list(response.streaming_content)
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(b''.join(chunks), self.content)
+
+    def test_range(self):
+        response = self.client.get('/media/uploads/2026/10/18/photo.jpg', HTTP_RANGE='bytes=100-199')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 100-199/{len(self.content)}')
+        self.assertEqual(b''.join(response.streaming_content), self.content[100:200])
+
+        size = len(self.content)
+        response = self.client.get('/media/uploads/2026/10/18/photo.jpg', HTTP_RANGE=f'bytes={size}-{size + 10}')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(b''.join(response.streaming_content), b'')
+
+    def test_immutable_and_not_modified(self):
+        response = self.client.get(f'/media/uploads/{HASHED_NAME}')
+        self.assertEqual(response['Cache-Control'], f'public, max-age={IMMUTABLE_MAX_AGE}, immutable')
+        self.assertEqual(response['Content-Type'], 'image/webp')
+
+        mtime = os.stat(os.path.join(self.root, 'uploads', HASHED_NAME)).st_mtime
+        response = self.client.get(f'/media/uploads/{HASHED_NAME}', HTTP_IF_MODIFIED_SINCE=http_date(mtime))
+        self.assertEqual(response.status_code, 304)
+
+    @patch('blog.media.MEDIA_SERVE_MODE', 'x-accel')
+    def test_x_accel_redirect(self):
+        response = self.client.get('/media/uploads/2026/10/18/photo.jpg')
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/uploads/2026/10/18/photo.jpg')
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertEqual(response.content, b'')
+
+    @patch('blog.media.MEDIA_SERVE_MODE', 'x-sendfile')
+    def test_x_sendfile(self):
+        response = self.client.get('/media/uploads/2026/10/18/photo.jpg')
+        self.assertEqual(response['X-Sendfile'], os.path.join(self.root, 'uploads/2026/10/18/photo.jpg'))
+
+    def test_not_found(self):
+        for path in ('/media/uploads/missing.jpg', '/media/../settings.py', '/media/uploads/'):
+            response = self.client.get(path)
+            self.assertNotIn('X-Accel-Redirect', response)
+            self.assertTemplateUsed(response, 'blog/base.html')
+        self.assertEqual(self.client.post('/media/uploads/2026/10/18/photo.jpg').status_code, 405)
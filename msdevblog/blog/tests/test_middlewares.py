@@ -1,10 +1,16 @@
+from unittest.mock import patch
+
 from django.contrib.auth import get_user_model
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
 from django.conf import settings
 from django.core.cache import cache
 
-from blog.models import Category, Post
-from blog.middlewares import categories, new_posts, tags_list
+from django.urls import reverse
+
+from blog.models import Category, Post, Comment
+from blog.middlewares import sidebar
 
 
 class MiddlewaresTestCase(TestCase):   # python manage.py test blog.tests.test_middlewares
@@ -53,26 +59,107 @@ class MiddlewaresTestCase(TestCase):   # python manage.py test blog.tests.test_m
         super().tearDownClass()
         settings.SECRET_KEY = None
 
+    def setUp(self) -> None:
+        cache.clear()
+        patcher = patch('blog.signals.prerender_files')     # отрисовка файлов в Celery после коммита
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
     def test_categories(self):
-        cats = categories(None)
-        self.assertEqual(cats['categories'][0]['title'], self.category.title)
-        self.assertEqual(cats['categories'][0]['slug'], self.category.slug)
+        cats = sidebar(None)
+        self.assertEqual(cats['categories'][0].title, self.category.title)
+        self.assertEqual(cats['categories'][0].slug, self.category.slug)
 
     def test_tags_list(self):
-        tags = tags_list(None)
+        tags = sidebar(None)
         self.assertEqual(tags['tags_list'][0].name, 'tag')
         self.assertEqual(tags['tags_list'][0].slug, 'tag')
 
+    def test_tag_cloud(self):
+        """ В облаке только теги опубликованных постов, по убыванию числа постов. """
+        with self.captureOnCommitCallbacks(execute=True):
+            Post.published.get(title='Название опубликованного поста 0').tags.add('tag', 'popular')
+            Post.published.get(title='Название опубликованного поста 1').tags.add('popular')
+            Post.objects.get(slug='None').tags.add('draft')
+        tags = sidebar(None)['tags_list']
+        self.assertEqual([(tag.name, tag.count) for tag in tags], [('popular', 2), ('tag', 2)])
+        self.assertEqual(tags[0].weight, 5)
+
+        Post.published.filter(title='Название опубликованного поста 1').update(status='DF')
+        with self.captureOnCommitCallbacks(execute=True):
+            Post.objects.get(title='Название опубликованного поста 1').save()   # статус изменен
+            Post.objects.get(title='Название опубликованного поста 0').delete()
+        tags = sidebar(None)['tags_list']
+        self.assertEqual([(tag.name, tag.count) for tag in tags], [('tag', 1)])
+        self.assertEqual(tags[0].weight, 1)
+
     def test_new_posts_fields(self):
-        posts = new_posts(None)
-        self.assertEqual(posts['new_posts'][0]['title'], self.post.title)
-        self.assertEqual(posts['new_posts'][0]['slug'], self.post.slug)
+        posts = sidebar(None)
+        self.assertEqual(posts['new_posts'][0].title, self.post.title)
+        self.assertEqual(posts['new_posts'][0].slug, self.post.slug)
 
     def test_new_posts_published_only(self):
-        cache.delete('new_posts')
-        self.assertEqual(len(new_posts(None)['new_posts']), 5)
+        self.assertEqual(len(sidebar(None)['new_posts']), 5)
 
     def test_new_posts_max_length(self):
-        cache.delete('new_posts')
         self.assertEqual(len(Post.published.all()), 9)
-        self.assertEqual(len(new_posts(None)['new_posts']), 5)
+        self.assertEqual(len(sidebar(None)['new_posts']), 5)
+
+    def test_sidebar_lazy(self):
+        """ Данные не читаются, пока шаблон их не использует, и читаются одним блоком. """
+        with CaptureQueriesContext(connection) as queries:
+            context = sidebar(None)
+            self.assertEqual(len(queries), 0)
+            list(context['categories'])
+            self.assertEqual(len(queries), 3)
+            list(context['new_posts'])
+            list(context['tags_list'])
+            self.assertEqual(len(queries), 3)
+
+    def test_page_cache_anonymous(self):
+        """ Повторный запрос анонимного читателя отдается из кэша страниц без запросов к БД. """
+        url = reverse('blog:category', args=['test-category'])
+        response = self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            cached = self.client.get(url)
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(cached.content, response.content)
+        self.assertEqual(cached.headers['ETag'], response.headers['ETag'])
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response.headers['ETag']).status_code, 304)
+
+    def test_page_cache_params(self):
+        """ Ключ учитывает параметры пагинации и не зависит от остальных параметров. """
+        url = reverse('blog:home')
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url, {'utm_source': 'rss'})
+            self.assertEqual(len(queries), 0)
+            self.client.get(url, {'page': 1})
+            self.assertNotEqual(len(queries), 0)
+
+    def test_page_cache_bypass(self):
+        """ Авторизованный пользователь и POST запросы не используют кэш страниц (страница отрисовывается). """
+        url = reverse('blog:home')
+        self.client.get(url)
+        self.assertIsNone(self.client.get(url).context)
+        self.client.force_login(self.user)
+        response = self.client.get(url)
+        self.assertIsNotNone(response.context)
+        self.assertContains(response, 'test_user')
+
+        self.client.logout()
+        Post.objects.create(user=self.user, cat=self.category, title='Пост кэша страниц',
+                            slug='page-cache-post', body='Текст', status='PB')
+        url = reverse('blog:post-detail', args=['page-cache-post'])
+        self.client.get(url)
+        self.assertIsNotNone(self.client.post(url, {'body': 'Комментарий'}).context)
+
+    def test_page_cache_invalidation(self):
+        """ Новый комментарий сбрасывает кэш страниц. """
+        post = Post.objects.create(user=self.user, cat=self.category, title='Пост кэша страниц',
+                                   slug='page-cache-post', body='Текст', status='PB')
+        url = reverse('blog:post-detail', args=['page-cache-post'])
+        self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):   # кэш страниц сбрасывается после коммита
+            Comment.objects.create(user=self.user, post=post, body='Новый комментарий')
+        self.assertContains(self.client.get(url), 'Новый комментарий')
@@ -14,10 +14,14 @@ AttributeError: type object '<имя_класса>' has no attribute 'cls_atomic
 Эта ошибка возникает именно в Django: в Unittest для Python такой проблемы нет.
 """
 
+from io import StringIO
+
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchQuery
+from django.core.management import call_command
 from django.test import TestCase
 
-from blog.models import Category, Post, Comment
+from blog.models import Category, Post, Comment, BlogTag
 
 
 class Settings(TestCase):   # python manage.py test blog.tests.test_models
@@ -79,6 +83,64 @@ class PostTestCase(Settings):
     def test_str(self):
         self.assertEqual(f'{self.post.title} - {self.post.user}', self.post.__str__())
 
+    def test_search_vector_on_save(self):
+        """ Поисковый вектор рассчитывается при сохранении и учитывает основы слов. """
+        query = SearchQuery('опубликованный', config='russian')
+        self.assertEqual(Post.objects.filter(search_vector=query).get(), self.post_published)
+
+        self.post_published.body = 'Новый текст про джанго'
+        self.post_published.save()
+        query = SearchQuery('джанго', config='russian')
+        self.assertTrue(Post.objects.filter(search_vector=query, pk=self.post_published.pk))
+
+    def test_excerpt_on_save(self):
+        post = Post.objects.create(
+            user=self.user,
+            cat=self.category,
+            title='Длинный пост',
+            body='<p>' + 'слово ' * 450 + '</p>'
+        )
+        self.assertEqual(post.word_count, 450)
+        self.assertEqual(post.reading_time, 3)
+        self.assertTrue(post.excerpt.startswith('<p>слово'))
+        self.assertTrue(post.excerpt.endswith('…</p>'))
+
+        post.body = 'Короткий текст'
+        post.save(update_fields=['body'])
+        post.refresh_from_db()
+        self.assertEqual(post.excerpt, 'Короткий текст')
+        self.assertEqual(post.word_count, 2)
+
+    def test_update_excerpt_command(self):
+        Post.objects.update(excerpt='', word_count=0)
+        call_command('update_excerpt', stdout=StringIO())
+        self.post_published.refresh_from_db()
+        self.assertEqual(self.post_published.excerpt, 'Текст опубликованного поста')
+        self.assertEqual(self.post_published.word_count, 3)
+
+    def test_tags_cache(self):
+        """ Снимок тегов поддерживается при добавлении, переименовании и удалении тегов. """
+        self.post_published.tags.add('python', 'django')
+        self.post_published.refresh_from_db()
+        self.assertEqual(self.post_published.tags_cache,
+                         [{'name': 'django', 'slug': 'django'}, {'name': 'python', 'slug': 'python'}])
+
+        tag = BlogTag.objects.get(name='python')
+        tag.name = 'Python3'
+        tag.save()
+        self.post_published.refresh_from_db()
+        self.assertIn({'name': 'Python3', 'slug': 'python'}, self.post_published.tags_cache)
+
+        self.post_published.tags.remove('django')
+        tag.delete()
+        self.post_published.refresh_from_db()
+        self.assertEqual(self.post_published.tags_cache, [])
+
+    def test_update_search_vector_command(self):
+        Post.objects.update(search_vector=None)
+        call_command('update_search_vector', stdout=StringIO())
+        self.assertFalse(Post.objects.filter(search_vector__isnull=True))
+
     def test_slug_field(self):
         """
         Если класс SlugField изменится на другой, проверяем, что поле проиндексировано и уникально.
@@ -0,0 +1,88 @@
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.conf import settings
+from django.core.cache import cache
+
+from blog.models import Category, Post
+from blog.sitemaps import PostSitemap
+
+
+@patch.object(PostSitemap, 'limit', 2)
+class SitemapsTestCase(TestCase):   # python manage.py test blog.tests.test_sitemaps
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        settings.SECRET_KEY = "some_test_secret_key!"
+        cls.user = get_user_model().objects.create_user(username='test_user',
+                                                        email='test_user@mail.ru',
+                                                        password='test_user_password')
+        cls.category = Category.objects.create(
+            title='Тест категории',
+            slug='test-category'
+        )
+        cls.posts = [
+            Post.objects.create(
+                user=cls.user,
+                cat=cls.category,
+                title=f'Пост карты сайта {x}',
+                slug=f'sitemap-post-{x}',
+                body='Текст поста',
+                status='PB'
+            ) for x in range(5)
+        ]
+
+    def setUp(self) -> None:
+        cache.clear()
+        patcher = patch('blog.signals.prerender_files')     # отрисовка файлов в Celery после коммита
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_sitemap_index(self):
+        response = self.client.get('/sitemap.xml')
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, '/sitemap-posts.xml?p=3')
+        self.assertNotContains(response, '/sitemap-posts.xml?p=4')
+
+    def test_sitemap_pages(self):
+        response = self.client.get('/sitemap-posts.xml', {'p': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, '/blog/sitemap-post-2/')
+        self.assertContains(response, '/blog/sitemap-post-3/')
+        self.assertNotContains(response, '/blog/sitemap-post-1/')
+        self.assertTrue(response.has_header('Last-Modified'))
+        # handler404 отдает base.html
+        self.assertTemplateUsed(self.client.get('/sitemap-posts.xml', {'p': 'x'}), 'blog/base.html')
+        self.assertTemplateUsed(self.client.get('/sitemap-pages.xml'), 'blog/base.html')
+
+    def test_sitemap_cached(self):
+        self.client.get('/sitemap-posts.xml', {'p': 1})
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/sitemap-posts.xml', {'p': 1})
+        self.assertContains(response, '/blog/sitemap-post-0/')
+        self.assertEqual(len(queries), 0)
+
+    def test_sitemap_page_invalidation(self):
+        """ Изменение поста сбрасывает только его страницу (и последующие при смене статуса) """
+        for page in (1, 2, 3):
+            self.client.get('/sitemap-posts.xml', {'p': page})
+
+        post = Post.objects.get(pk=self.posts[2].pk)
+        post.slug = 'sitemap-post-renamed'
+        with self.captureOnCommitCallbacks(execute=True):
+            post.save()
+            # до коммита страница не сброшена: иначе параллельный запрос закэшировал бы прежние данные
+            self.assertNotContains(self.client.get('/sitemap-posts.xml', {'p': 2}), '/blog/sitemap-post-renamed/')
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/sitemap-posts.xml', {'p': 1})
+        self.assertEqual(len(queries), 0)
+        self.assertContains(self.client.get('/sitemap-posts.xml', {'p': 2}), '/blog/sitemap-post-renamed/')
+
+        post.status = 'DF'
+        with self.captureOnCommitCallbacks(execute=True):
+            post.save()
+        self.assertContains(self.client.get('/sitemap-posts.xml', {'p': 2}), '/blog/sitemap-post-4/')
+        self.assertTemplateUsed(self.client.get('/sitemap-posts.xml', {'p': 3}), 'blog/base.html')
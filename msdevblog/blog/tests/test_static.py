@@ -0,0 +1,49 @@
+import gzip
+import os
+import re
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
+
+import brotli
+from django.core.management import call_command
+from django.templatetags.static import static
+from django.test import SimpleTestCase, override_settings
+
+from blog.utils import CompressedManifestStaticFilesStorage
+
+
+class StaticFilesTestCase(SimpleTestCase):   # python manage.py test blog.tests.test_static
+    def setUp(self) -> None:
+        tmp_dir = TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.root = tmp_dir.name
+
+    def test_no_manifest(self):
+        # collectstatic не запускался - адреса без хэша
+        with override_settings(STATIC_ROOT=self.root):
+            self.assertEqual(static('css/blog.css'), '/static/css/blog.css')
+
+    def test_collectstatic(self):
+        with override_settings(STATIC_ROOT=self.root):
+            call_command('collectstatic', interactive=False, verbosity=0)
+            url = static('css/blog.css')
+            self.assertRegex(url, r'^/static/css/blog\.[0-9a-f]{12}\.css$')
+            # повторный запрос адреса не обращается к манифесту и файлам
+            with patch.object(CompressedManifestStaticFilesStorage, 'stored_name', side_effect=AssertionError), \
+                    patch.object(CompressedManifestStaticFilesStorage, 'exists', side_effect=AssertionError):
+                self.assertEqual(static('css/blog.css'), url)
+            # файла нет в манифесте - ошибка, а не адрес без хэша
+            with self.assertRaises(ValueError):
+                static('css/missing.css')
+
+            hashed_path = os.path.join(self.root, url[len('/static/'):])
+            with open(hashed_path, 'rb') as file:
+                content = file.read()
+            with open(hashed_path + '.gz', 'rb') as compressed:
+                self.assertEqual(gzip.decompress(compressed.read()), content)
+            with open(hashed_path + '.br', 'rb') as compressed:
+                self.assertEqual(brotli.decompress(compressed.read()), content)
+            # изображения не сжимаются
+            png = static('images/rss.png')
+            self.assertFalse(os.path.exists(os.path.join(self.root, png[len('/static/'):] + '.gz')))
+            self.assertTrue(re.search(r'\.[0-9a-f]{12}\.png$', png))
@@ -0,0 +1,88 @@
+import os
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.conf import settings
+from django.core.cache import cache
+
+from blog.models import Category, Post
+from blog.sitemaps import PostSitemap
+from blog.tasks import prerender_feeds_and_sitemaps, prerender_files
+from blog.utils import write_atomic
+
+
+class TasksTestCase(TestCase):   # python manage.py test blog.tests.test_tasks
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        settings.SECRET_KEY = "some_test_secret_key!"
+        cls.user = get_user_model().objects.create_user(username='test_user',
+                                                        email='test_user@mail.ru',
+                                                        password='test_user_password')
+        cls.category = Category.objects.create(title='Тест категории', slug='test-category')
+        cls.post = Post.objects.create(
+            user=cls.user,
+            cat=cls.category,
+            title='Пост для отрисовки',
+            slug='prerender-post',
+            body='Текст поста',
+            status='PB'
+        )
+        cls.post.tags.add('python')
+
+    def setUp(self) -> None:
+        cache.clear()
+        tmp_dir = TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.root = tmp_dir.name
+        patcher = patch('blog.tasks.PRERENDER_ROOT', self.root)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def read(self, *path):
+        with open(os.path.join(self.root, *path), encoding='utf-8') as file:
+            return file.read()
+
+    def test_write_atomic(self):
+        file_path = os.path.join(self.root, 'dir', 'file.xml')
+        write_atomic(file_path, b'first')
+        write_atomic(file_path, b'second')
+        self.assertEqual(self.read('dir', 'file.xml'), 'second')
+        self.assertEqual(os.listdir(os.path.join(self.root, 'dir')), ['file.xml'])
+
+    @patch.object(PostSitemap, 'limit', 1)
+    def test_prerender_feeds_and_sitemaps(self):
+        write_atomic(os.path.join(self.root, 'sitemap-posts-5.xml'), b'stale')
+        prerender_feeds_and_sitemaps()
+        self.assertIn('Пост для отрисовки', self.read('blog', 'feed', 'index.xml'))
+        self.assertIn('Пост для отрисовки', self.read('blog', 'feed', 'category', 'test-category', 'index.xml'))
+        self.assertIn('Пост для отрисовки', self.read('blog', 'feed', 'tag', 'python', 'index.xml'))
+        self.assertIn('/sitemap-posts.xml', self.read('sitemap.xml'))
+        self.assertIn('/blog/prerender-post/', self.read('sitemap-posts-1.xml'))
+        self.assertFalse(os.path.exists(os.path.join(self.root, 'sitemap-posts-5.xml')))
+
+    def test_prerender_files_deleted_tag(self):
+        write_atomic(os.path.join(self.root, 'blog', 'feed', 'tag', 'deleted', 'index.xml'), b'stale')
+        prerender_files(tag_slugs=['deleted'], latest=False)
+        self.assertFalse(os.path.exists(os.path.join(self.root, 'blog', 'feed', 'tag', 'deleted', 'index.xml')))
+
+    @patch('blog.signals.prerender_files.delay')
+    def test_prerender_on_publish(self, delay):
+        """ После коммита сохранения опубликованного поста или снятия с публикации перерисовываются его файлы. """
+        post = Post.objects.get(pk=self.post.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            post.save()
+        delay.assert_called_once_with(['test-category'], ['python'], 1)
+
+        delay.reset_mock()
+        post.status = 'DF'
+        with self.captureOnCommitCallbacks(execute=True):
+            post.save()
+        delay.assert_called_once_with(['test-category'], ['python'], 1)
+
+        delay.reset_mock()
+        with self.captureOnCommitCallbacks(execute=True):   # черновик не попадает в ленты и карту сайта
+            post.save()
+        delay.assert_not_called()
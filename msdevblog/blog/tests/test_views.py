@@ -1,16 +1,23 @@
+from unittest.mock import patch
+
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
 from django.core.cache import cache
 from django.test.utils import CaptureQueriesContext
 from django.db import connection
-from django.test import TestCase, Client
+from django.test import TestCase, Client, RequestFactory, modify_settings
 from django.urls import reverse
 from django.conf import settings
-from django.contrib.messages import get_messages
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.messages import SUCCESS, add_message, get_messages
+from django.contrib.messages.storage.cookie import CookieStorage
 
 from captcha.conf import settings as captcha_settings
 
 from blog.models import Category, Post, Comment
+from blog.search import SUGGEST_LIMIT, facet_counts
+from blog.views import PostListView, list_etag, post_detail_etag, post_detail_last_modified
+from msdevblog.settings import PAGINATE_BY_CONST
 
 
 class ViewsTestSettings(TestCase):  # python manage.py test blog.tests.test_views
@@ -68,6 +75,12 @@ class ViewsTestSettings(TestCase):  # python manage.py test blog.tests.test_view
         settings.SECRET_KEY = None
         captcha_settings.CAPTCHA_TEST_MODE = False
 
+    def setUp(self) -> None:
+        cache.clear()  # кэш не откатывается вместе с транзакцией теста
+        patcher = patch('blog.signals.prerender_files')     # отрисовка файлов в Celery после коммита
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
     def test_post_list_view(self):
         response = self.client.get(reverse('blog:home'))
         object_list = response.context.get('object_list')
@@ -83,7 +96,7 @@ class ViewsTestSettings(TestCase):  # python manage.py test blog.tests.test_view
             cache.delete('tags')
             response = self.client.get(reverse('blog:home'))
             self.assertEqual(response.status_code, 200)
-            self.assertEqual(len(queries), 6, "Увеличилось число запросов в БД!")
+            self.assertEqual(len(queries), 5, "Увеличилось число запросов в БД!")
 
     def test_post_detail_get_published(self):
         response = self.client.get(reverse('blog:post-detail', kwargs={'slug': 'nazvanie-opublikovannogo-posta'}))
@@ -134,7 +147,141 @@ class ViewsTestSettings(TestCase):  # python manage.py test blog.tests.test_view
             cache.delete('tags')
             response = self.client.get(reverse('blog:post-detail', kwargs={'slug': 'nazvanie-opublikovannogo-posta'}))
             self.assertEqual(response.status_code, 200)
-            self.assertEqual(len(queries), 6, "Увеличилось число запросов в БД!")
+            self.assertEqual(len(queries), 5, "Увеличилось число запросов в БД!")
+
+    @modify_settings(MIDDLEWARE={'remove': 'blog.middlewares.AnonymousPageCacheMiddleware'})
+    def test_post_detail_cached(self):
+        """ Повторный просмотр поста анонимным читателем не обращается к БД (кэш фрагментов). """
+        url = reverse('blog:post-detail', kwargs={'slug': 'nazvanie-opublikovannogo-posta'})
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+            self.assertEqual(len(queries), 0)
+        self.assertEqual(response.context.get('object'), self.post_published)
+        self.assertContains(response, 'Текст опубликованного поста')
+
+    def test_post_detail_not_modified(self):
+        """ Повторный запрос с ETag получает 304 без запросов к БД, комментарий меняет ETag. """
+        url = reverse('blog:post-detail', kwargs={'slug': 'nazvanie-opublikovannogo-posta'})
+        response = self.client.get(url)
+        etag = response.headers['ETag']
+        self.assertTrue(response.has_header('Last-Modified'))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(len(queries), 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.create(user=self.user, post=self.post_published, body='Новый комментарий')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_post_detail_older_comment_deleted(self):
+        """ Удаление не последнего комментария меняет ETag и Last-Modified. """
+        url = reverse('blog:post-detail', kwargs={'slug': 'nazvanie-opublikovannogo-posta'})
+        with self.captureOnCommitCallbacks(execute=True):
+            older = Comment.objects.create(user=self.user, post=self.post_published, body='Старый комментарий')
+            Comment.objects.create(user=self.user, post=self.post_published, body='Новый комментарий')
+        response = self.client.get(url)
+        self.assertContains(response, 'Старый комментарий')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            older.delete()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response.headers['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, 'Старый комментарий')
+
+    def test_etag_skipped_with_messages(self):
+        """ При непоказанных сообщениях страница отрисовывается, а не отдается 304. """
+        request = RequestFactory().get(reverse('blog:home'))
+        request.user = AnonymousUser()
+        request._messages = CookieStorage(request)
+        self.assertTrue(list_etag(request))
+        add_message(request, SUCCESS, 'Профиль обновлен.')
+        self.assertIsNone(list_etag(request))
+        self.assertIsNone(post_detail_etag(request, 'nazvanie-opublikovannogo-posta'))
+        self.assertIsNone(post_detail_last_modified(request, 'nazvanie-opublikovannogo-posta'))
+
+    def test_post_detail_etag_user(self):
+        """ У автора поста своя версия страницы (кнопка редактирования) """
+        url = reverse('blog:post-detail', kwargs={'slug': 'nazvanie-opublikovannogo-posta'})
+        etag = self.client.get(url).headers['ETag']
+        response = self.auth_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context.get('is_author'))
+        self.assertFalse(response.has_header('Last-Modified'))
+        self.assertEqual(self.auth_client.get(url, HTTP_IF_NONE_MATCH=response.headers['ETag']).status_code, 304)
+        self.assertNotEqual(self.auth_not_owner_user_client.get(url).headers['ETag'], response.headers['ETag'])
+
+    def test_list_not_modified(self):
+        url = reverse('blog:home')
+        etag = self.client.get(url).headers['ETag']
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(len(queries), 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Post.objects.create(user=self.user, cat=self.category, title='Новый пост', slug='new-post',
+                                body='Текст', status='PB')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_list_author_changed(self):
+        """ Изменение имени автора меняет ETag списков постов. """
+        url = reverse('blog:home')
+        etag = self.client.get(url).headers['ETag']
+        user = get_user_model().objects.get(pk=self.user.pk)
+        user.username = 'renamed_user'
+        with self.captureOnCommitCallbacks(execute=True):
+            user.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_post_detail_cache_invalidation(self):
+        url = reverse('blog:post-detail', kwargs={'slug': 'nazvanie-opublikovannogo-posta'})
+        self.client.get(url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.create(user=self.user, post=self.post_published, body='Новый комментарий')
+        self.assertContains(self.client.get(url), 'Новый комментарий')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post_published.tags.add('new-tag')
+        self.assertContains(self.client.get(url), '_new-tag_')
+
+        self.post_published.body = 'Измененный текст поста'
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.post_published.save()
+            self.assertNotContains(self.client.get(url), 'Измененный текст поста')  # до коммита кэш не сброшен
+        self.assertTrue(callbacks)
+        self.assertContains(self.client.get(url), 'Измененный текст поста')
+
+    @modify_settings(MIDDLEWARE={'remove': 'blog.middlewares.AnonymousPageCacheMiddleware'})
+    def test_post_fragments_invalidated_after_commit(self):
+        """ Фрагменты комментариев и текста поста сбрасываются только после коммита. """
+        url = reverse('blog:post-detail', kwargs={'slug': 'nazvanie-opublikovannogo-posta'})
+        self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.create(user=self.user, post=self.post_published, body='Новый комментарий')
+            self.post_published.tags.add('new-tag')
+            response = self.client.get(url)
+            self.assertNotContains(response, 'Новый комментарий')
+            self.assertNotContains(response, '_new-tag_')
+        response = self.client.get(url)
+        self.assertContains(response, 'Новый комментарий')
+        self.assertContains(response, '_new-tag_')
+
+    def test_post_detail_author_changed(self):
+        url = reverse('blog:post-detail', kwargs={'slug': 'nazvanie-opublikovannogo-posta'})
+        self.client.get(url)
+        user = get_user_model().objects.get(pk=self.user.pk)
+        user.bio = 'Новая информация об авторе'
+        with self.captureOnCommitCallbacks(execute=True):
+            user.save()
+        self.assertContains(self.client.get(url), 'Новая информация об авторе')
+
+        # вход на сайт (обновление last_login) кэш не сбрасывает
+        with self.captureOnCommitCallbacks() as callbacks:
+            user.save(update_fields=['last_login'])
+        self.assertFalse(callbacks)
 
     def test_post_create_view_not_auth_user(self):
         data = {
@@ -262,7 +409,7 @@ class ViewsTestSettings(TestCase):  # python manage.py test blog.tests.test_view
             cache.delete('tags')
             response = self.client.get(reverse('blog:category', kwargs={'slug': self.category.slug}))
             self.assertEqual(response.status_code, 200)
-            self.assertEqual(len(queries), 5, "Увеличилось число запросов в БД!")
+            self.assertEqual(len(queries), 4, "Увеличилось число запросов в БД!")
 
     def test_post_by_tag_list_view(self):
         response = self.client.get(reverse('blog:tag', kwargs={'slug': 'tag'}))
@@ -277,7 +424,7 @@ class ViewsTestSettings(TestCase):  # python manage.py test blog.tests.test_view
             cache.delete('tags')
             response = self.client.get(reverse('blog:tag', kwargs={'slug': 'tag'}))
             self.assertEqual(response.status_code, 200)
-            self.assertEqual(len(queries), 5, "Увеличилось число запросов в БД!")
+            self.assertEqual(len(queries), 4, "Увеличилось число запросов в БД!")
 
     def test_feedback_get(self):
         response = self.client.get(reverse('blog:feedback'))
@@ -313,6 +460,115 @@ class ViewsTestSettings(TestCase):  # python manage.py test blog.tests.test_view
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.context.get('object_list')[0], self.post_published)
 
+    def test_search_view_transliteration(self):
+        """ Запрос латиницей находит пост на русском. """
+        form_data = {
+            'searched': 'opublikovannogo posta'
+        }
+        response = self.client.post(reverse('blog:post-search'), data=form_data)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context.get('object_list')), [self.post_published])
+
+    def test_search_view_get_paginated(self):
+        for post in range(PAGINATE_BY_CONST + 1):
+            Post.objects.create(user=self.user, cat=self.category, title=f'Поиск страницы {post}',
+                                slug=f'search-page-{post}', body='Текст', status='PB')
+        response = self.client.get(reverse('blog:post-search'), {'searched': '  Поиск  СТРАНИЦЫ '})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context.get('object_list')), PAGINATE_BY_CONST)
+        self.assertContains(response, '?searched=%D0%BF%D0%BE%D0%B8%D1%81%D0%BA+%D1%81%D1%82%D1%80%D0%B0'
+                                      '%D0%BD%D0%B8%D1%86%D1%8B&amp;page=2')
+        response = self.client.get(reverse('blog:post-search'), {'searched': 'поиск страницы', 'page': 2})
+        self.assertEqual(len(response.context.get('object_list')), 1)
+
+    def test_search_view_result_cache(self):
+        """ Повторный запрос берет id постов из кэша и не ранжирует посты заново. """
+        url = reverse('blog:post-search')
+        self.client.get(url, {'searched': 'опубликованного поста'})
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {'searched': 'Опубликованного  поста'})
+        self.assertEqual(list(response.context.get('object_list')), [self.post_published])
+        self.assertFalse([query for query in queries if 'ts_rank' in query['sql']])
+
+        post = Post.objects.get(pk=self.post_published.pk)
+        post.title = 'Переименованный пост'
+        post.body = 'Новый текст'
+        with self.captureOnCommitCallbacks(execute=True):
+            post.save()  # после коммита версия кэша поиска сменилась
+        response = self.client.get(url, {'searched': 'опубликованного поста'})
+        self.assertEqual(list(response.context.get('object_list')), [])
+
+    def test_search_view_headline(self):
+        """ Фрагмент текста с найденными словами, повторный запрос берет его из кэша. """
+        post = Post.objects.get(pk=self.post_published.pk)
+        post.body = '<p>Вступление.</p><p>Здесь <b>опубликованного</b> текста много.</p>'
+        post.save()
+        url = reverse('blog:post-search')
+        response = self.client.get(url, {'searched': 'опубликованного'})
+        headline = response.context.get('object_list')[0].headline
+        self.assertIn('<mark>опубликованного</mark>', headline)
+        self.assertNotIn('<b>', headline)
+        self.assertContains(response, '<mark>опубликованного</mark>')
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {'searched': 'опубликованного'})
+        self.assertEqual(response.context.get('object_list')[0].headline, headline)
+        self.assertFalse([query for query in queries if 'ts_headline' in query['sql']])
+
+    def test_search_view_facets(self):
+        """ Счетчики категорий и тегов найденных постов, выбранные фильтры сужают результат. """
+        category = Category.objects.create(title='Другая категория', slug='other-category')
+        for number, cat in enumerate([self.category, category, category]):
+            post = Post.objects.create(user=self.user, cat=cat, title=f'Фильтр поиска {number}',
+                                       slug=f'facet-{number}', body='Текст', status='PB')
+            post.tags.add('python', *(['django'] if number else []))
+        url = reverse('blog:post-search')
+
+        response = self.client.get(url, {'searched': 'фильтр'})
+        facets = response.context.get('facets')
+        self.assertEqual([(facet.slug, facet.count) for facet in facets['cat']],
+                         [('other-category', 2), ('test-category', 1)])
+        self.assertEqual([(facet.slug, facet.count) for facet in facets['tag']], [('python', 3), ('django', 2)])
+        self.assertContains(response, '?searched=%D1%84%D0%B8%D0%BB%D1%8C%D1%82%D1%80&amp;tag=django')
+
+        response = self.client.get(url, {'searched': 'фильтр', 'cat': 'other-category', 'tag': 'django'})
+        self.assertEqual([post.slug for post in response.context.get('object_list')], ['facet-2', 'facet-1'])
+        response = self.client.get(url, {'searched': 'фильтр', 'cat': 'test-category', 'tag': 'django'})
+        self.assertEqual(list(response.context.get('object_list')), [])
+
+    def test_search_view_facets_one_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            facet_counts([self.post_published.pk])
+        self.assertEqual(len([query for query in queries if 'GROUP BY' in query['sql']]), 1)
+
+    def test_search_suggest(self):
+        """ Подсказки по началу слова и по слову с опечаткой, только опубликованные посты. """
+        post = Post.objects.create(user=self.user, cat=self.category, title='Уроки Django для начинающих',
+                                   slug='uroki-django', body='Текст', status='PB')
+        post.tags.add('Django')
+        url = reverse('blog:post-search-suggest')
+        response = self.client.get(url, {'q': 'Djan'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {
+            'posts': [{'title': 'Уроки Django для начинающих', 'url': '/blog/uroki-django/'}],
+            'tags': [{'name': 'Django', 'url': '/blog/by-tag/django/'}],
+        })
+        response = self.client.get(url, {'q': 'опубликованого'})
+        self.assertEqual([post['title'] for post in response.json()['posts']], ['Название опубликованного поста'])
+        response = self.client.get(url, {'q': 'Название'})
+        self.assertNotIn('Название поста', [post['title'] for post in response.json()['posts']])
+
+    def test_search_suggest_limits(self):
+        for post in range(SUGGEST_LIMIT + 3):
+            Post.objects.create(user=self.user, cat=self.category, title=f'Подсказка {post}',
+                                slug=f'suggest-{post}', body='Текст', status='PB')
+        url = reverse('blog:post-search-suggest')
+        self.assertEqual(len(self.client.get(url, {'q': 'подсказка'}).json()['posts']), SUGGEST_LIMIT)
+        self.assertEqual(self.client.get(url, {'q': 'п'}).json(), {'posts': [], 'tags': []})
+        with connection.cursor() as cursor:
+            cursor.execute('SHOW statement_timeout')
+            self.assertEqual(cursor.fetchone()[0], '0')
+
     def test_search_view_empty(self):
         form_data = {
             'searched': ''
@@ -340,6 +596,37 @@ class ViewsTestSettings(TestCase):  # python manage.py test blog.tests.test_view
         response = self.client.get('/blog/?page=2')
         self.assertEqual(len(response.context.get('object_list')), 1, msg='Проверка второй страницы')
 
+    @patch.object(PostListView, 'cursor_pagination', True)
+    def test_cursor_paginator(self):
+        for post in range(30):
+            Post.objects.create(
+                user=self.user,
+                cat=self.category,
+                title=f'Test cursor {post}',
+                slug=f'test-cursor-{post}',
+                body=f'Test cursor text {post}',
+                status='PB'
+            )
+        response = self.client.get(reverse('blog:home'))
+        first_page = response.context.get('page_obj')
+        self.assertEqual(len(first_page), 25, msg='Проверка первой страницы')
+        self.assertFalse(first_page.has_previous)
+        self.assertTrue(first_page.has_next)
+
+        response = self.client.get(reverse('blog:home'), {'cursor': first_page.next_cursor})
+        second_page = response.context.get('page_obj')
+        self.assertEqual(len(second_page), 6, msg='Проверка второй страницы')
+        self.assertFalse(second_page.has_next)
+        self.assertFalse(set(first_page) & set(second_page), msg='Страницы не пересекаются')
+
+        response = self.client.get(reverse('blog:home'), {'cursor': second_page.previous_cursor})
+        self.assertEqual(list(response.context.get('page_obj')), list(first_page), msg='Возврат на первую страницу')
+
+    @patch.object(PostListView, 'cursor_pagination', True)
+    def test_cursor_paginator_bad_cursor(self):
+        response = self.client.get(reverse('blog:home'), {'cursor': 'bad-cursor'})
+        self.assertTemplateNotUsed(response, 'blog/post_list.html')  # обрабатывается как страница 404
+
     def test_about_view(self):
         response = self.client.get(reverse('blog:about'))
         self.assertEqual(response.status_code, 200)
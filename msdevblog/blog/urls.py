@@ -1,7 +1,7 @@
 from django.urls import path
 
 from .views import *
-from .feeds import LatestPostsFeed
+from .feeds import LatestPostsFeed, CategoryPostsFeed, TagPostsFeed
 
 app_name = 'blog'
 
@@ -13,7 +13,10 @@ urlpatterns = [
     path('by-tag/<slug:slug>/', ByTagListView.as_view(), name='tag'),
     path('feedback/', feedback, name='feedback'),
     path('search/', search_view, name='post-search'),
+    path('search/suggest/', search_suggest, name='post-search-suggest'),
     path('feed/', LatestPostsFeed(), name='post-feed'),
+    path('feed/category/<slug:slug>/', CategoryPostsFeed(), name='category-feed'),
+    path('feed/tag/<slug:slug>/', TagPostsFeed(), name='tag-feed'),
     path('about/', about_view, name='about'),
     path('<slug:slug>/', post_detail, name='post-detail'),
 ]
@@ -1,18 +1,67 @@
+import gzip
 import os
+import tempfile
+from hashlib import sha256
+from math import ceil
+
+import brotli
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
 from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.template.defaultfilters import truncatewords_html
+from django.utils.html import strip_tags
 from urllib.parse import urljoin
 from datetime import datetime
 from django.conf import settings
 
+EXCERPT_WORDS = 30          # число слов в анонсе поста
+WORDS_PER_MINUTE = 200      # средняя скорость чтения, слов в минуту
+
+COMPRESS_EXTENSIONS = ('.css', '.js', '.mjs', '.map', '.json', '.svg', '.txt', '.xml', '.html', '.ico', '.ttf')
+COMPRESS_MIN_SIZE = 512     # меньшие файлы не сжимаем, выигрыш меньше накладных расходов
+
+
+def make_excerpt(body: str) -> tuple[str, int, int]:
+    """
+    Рассчитывает анонс поста (первые EXCERPT_WORDS слов с сохранением html разметки),
+    число слов и время чтения в минутах.
+    """
+    word_count = len(strip_tags(body).split())
+    reading_time = max(1, ceil(word_count / WORDS_PER_MINUTE))
+    return truncatewords_html(body, EXCERPT_WORDS), word_count, reading_time
+
+
+def write_atomic(file_path: str, content: bytes) -> None:
+    """
+    Записывает файл атомарно: во временный файл в том же каталоге, затем переименование.
+    Читатель (nginx) видит либо прежний, либо новый файл целиком.
+    """
+    directory = os.path.dirname(file_path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            file.write(content)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
 
 class CkeditorCustomStorage(FileSystemStorage):
     """
     Изменяем расположение медиа файлов редактора CKEditor.
     Для применения указываем в настройках settings.py:
         CKEDITOR_5_FILE_STORAGE = 'blog.utils.CkeditorCustomStorage'
+
+    При content_addressed (settings.UPLOADS_CONTENT_ADDRESSED) имя файла - хэш содержимого:
+    загрузка пишется во временный файл с одновременным расчетом хэша, если файл с таким
+    хэшем уже есть - временный удаляется и возвращается имя существующего.
     """
     location = os.path.join(settings.MEDIA_ROOT, 'uploads/')
     base_url = urljoin(settings.MEDIA_URL, 'uploads/')
+    content_addressed = settings.UPLOADS_CONTENT_ADDRESSED
 
     def get_folder_name(self):
         return datetime.now().strftime('%Y/%m/%d')
@@ -20,7 +69,108 @@ class CkeditorCustomStorage(FileSystemStorage):
     def get_valid_name(self, name):
         return name
 
+    @staticmethod
+    def hashed_name(digest, name):
+        """ Имя файла по хэшу содержимого: ab/cd/abcd...ef.jpg """
+        return os.path.join(digest[:2], digest[2:4], digest + os.path.splitext(name)[1].lower())
+
     def _save(self, name, content):
-        folder_name = self.get_folder_name()
-        name = os.path.join(folder_name, self.get_valid_name(name))
-        return super()._save(name, content)
+        if self.content_addressed:
+            name, created = self._save_hashed(name, content)
+        else:
+            folder_name = self.get_folder_name()
+            name = os.path.join(folder_name, self.get_valid_name(name))
+            name, created = super()._save(name, content), True
+        # уменьшенные копии изображения рассчитываем в Celery, чтобы не задерживать загрузку;
+        # для уже сохраненного файла - если копий нет (задача не выполнилась)
+        from .images import is_image
+        from .models import UploadedImage
+        from .tasks import make_image_variants
+        if is_image(name) and (created or not UploadedImage.objects.filter(name=name).exists()):
+            transaction.on_commit(lambda: make_image_variants.delay(name), robust=True)
+        return name
+
+    def _save_hashed(self, name, content):
+        """ Сохраняет файл под именем по хэшу содержимого, возвращает (имя, создан ли новый файл) """
+        os.makedirs(self.location, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.location, prefix='.tmp-')
+        try:
+            digest = sha256()
+            with os.fdopen(fd, 'wb') as file:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    file.write(chunk)
+            name = self.hashed_name(digest.hexdigest(), name)
+            if self.exists(name):
+                os.unlink(tmp_path)
+                # файл снова используется - обновляем время изменения, чтобы gc_uploads
+                # не удалил его до сохранения поста
+                os.utime(self.path(name))
+                return name, False
+            os.makedirs(os.path.dirname(self.path(name)), exist_ok=True)
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, self.path(name))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        return name, True
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    collectstatic сохраняет файлы с хэшем содержимого в имени (css/blog.55e7cbb9ba48.css)
+    и рядом сжатые копии .gz и .br, веб-сервер отдает их
+    без сжатия на лету (nginx: gzip_static on; brotli_static on; expires max;).
+    Для применения указываем в настройках settings.py:
+        STORAGES['staticfiles']['BACKEND'] = 'blog.utils.CompressedManifestStaticFilesStorage'
+
+    Манифест читается один раз при создании хранилища, адреса {% static %} запоминаются в памяти.
+    Если collectstatic не запускался (локальный запуск, тесты), отдаются адреса без хэша.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._urls = {}
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            if self.hashed_files:   # манифест есть, но файла в нем нет - ошибка сборки, не скрываем
+                raise
+            return name
+
+    def url(self, name, force=False):
+        if force or settings.DEBUG:
+            return super().url(name, force)
+        try:
+            return self._urls[name]
+        except KeyError:
+            url = self._urls[name] = super().url(name)
+            return url
+
+    def post_process(self, paths, dry_run=False, **options):
+        hashed_names = set()
+        for name, hashed_name, processed in super().post_process(paths, dry_run, **options):
+            if hashed_name and not isinstance(processed, Exception):
+                hashed_names.add(hashed_name)
+            yield name, hashed_name, processed
+        if dry_run:
+            return
+        for hashed_name in hashed_names:
+            self.compress(hashed_name)
+        self._urls = {}
+
+    def compress(self, name):
+        """ Сохраняет сжатые копии файла name.gz и name.br, если они меньше исходного """
+        if not name.lower().endswith(COMPRESS_EXTENSIONS):
+            return
+        with self.open(name) as file:
+            content = file.read()
+        if len(content) < COMPRESS_MIN_SIZE:
+            return
+        compressed = {'.gz': gzip.compress(content, compresslevel=9, mtime=0), '.br': brotli.compress(content)}
+        for extension, data in compressed.items():
+            if len(data) < len(content):
+                write_atomic(self.path(name + extension), data)
@@ -1,49 +1,162 @@
+from hashlib import md5
+
 from django.contrib.auth.mixins import UserPassesTestMixin
-from django.contrib.postgres.search import SearchVector, SearchQuery, SearchRank
+from django.core.paginator import Paginator
 from django.core.exceptions import ValidationError
 from django.db.models import Subquery
 from django.urls import reverse
-from django.views.decorators.http import require_POST
+from django.utils.http import urlencode
+from django.views.decorators.cache import cache_control
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition, require_GET, require_http_methods
 from django.views.generic import ListView, CreateView, UpdateView
+from django.contrib.sitemaps import views as sitemaps_views
+from django.http import Http404, HttpResponse, JsonResponse
 from django.shortcuts import get_object_or_404, render, redirect
 from django.contrib import messages
+from django.contrib.messages import get_messages
 from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
 
-from msdevblog.settings import PAGINATE_BY_CONST
+from msdevblog.settings import PAGINATE_BY_CONST, PAGINATE_BY_CURSOR
+from .caching import (POST_CACHE_TIMEOUT, SITEMAP_TIMEOUT, SIDEBAR, get_or_compute, get_version, post_meta_key,
+                      post_article_key, post_comments_key, get_comments_changed, sitemap_key)
 from .models import Post, Category, Comment, BlogTag
+from .paginators import CursorPaginationMixin
+from .sitemaps import SITEMAPS
+from .search import normalize_query, search_results, add_headlines, suggest
 from .forms import PostForm, CommentForm, FeedbackForm
 from .tasks import send_feedback_mail
 
 
-class PostListView(ListView):
+def _set_post_meta(post):
+    meta = {'id': post.id, 'user_id': post.user_id, 'time_updated': post.time_updated}
+    cache.set(post_meta_key(post.slug), meta, POST_CACHE_TIMEOUT)
+    return meta
+
+
+def _user_state(request):
+    """ Данные пользователя, от которых зависит страница (меню, форма комментария, кнопка редактирования) """
+    user = request.user
+    if not user.is_authenticated:
+        return 'anonymous'
+    return md5(f'{user.pk}|{user.username}|{user.email}|{user.is_email_activated}'.encode()).hexdigest()
+
+
+def _has_messages(request):
+    """
+    Есть непоказанные сообщения (django.contrib.messages) - страницу нужно отрисовать,
+    ответ 304 по ETag или Last-Modified оставил бы в браузере страницу без сообщения
+    """
+    return bool(len(get_messages(request)))
+
+
+def list_etag(request, *args, **kwargs):
+    """
+    ETag страниц списков постов. Списки меняются вместе с боковой панелью
+    (посты, категории, теги - blog/signals.py), поэтому достаточно ее версии.
+    """
+    if _has_messages(request):
+        return None
+    return f'list-{get_version(SIDEBAR)}-{_user_state(request)}'
+
+
+def _post_etag_data(request, slug):
+    """
+    Время изменения поста и его комментариев из кэша, запрос к БД только при отсутствии поста в кэше.
+    Выбранный пост передается в post_detail через request, чтобы не выбирать его повторно.
+    """
+    meta = cache.get(post_meta_key(slug))
+    if meta is None:
+        post = _post_detail_queryset().filter(slug=slug).first()
+        if post is None:
+            return None, None
+        request.blog_post = post
+        meta = _set_post_meta(post)
+    return meta, get_comments_changed(meta['id'])
+
+
+def post_detail_etag(request, slug):
+    if _has_messages(request):
+        return None
+    meta, comments_changed = _post_etag_data(request, slug)
+    if meta is None:
+        return None
+    return (f'post-{meta["id"]}-{meta["time_updated"].timestamp()}-{comments_changed.timestamp()}-'
+            f'{get_version(SIDEBAR)}-{_user_state(request)}')
+
+
+def post_detail_last_modified(request, slug):
+    """ Только для анонимных читателей: страница пользователя меняется и без изменения поста """
+    if request.user.is_authenticated or _has_messages(request):
+        return None
+    meta, comments_changed = _post_etag_data(request, slug)
+    if meta is None:
+        return None
+    return max(meta['time_updated'], comments_changed)
+
+
+@method_decorator(condition(etag_func=list_etag), name='dispatch')
+class PostListView(CursorPaginationMixin, ListView):
     model = Post
     template_name = 'blog/post_list.html'
     extra_context = {'selected': 'home'}
     paginate_by = PAGINATE_BY_CONST
+    cursor_pagination = PAGINATE_BY_CURSOR
 
     def get_queryset(self):
-        return Post.published.select_related('user').prefetch_related('tags') \
-            .only('title', 'slug', 'body', 'time_updated', 'user__username')
+        return Post.published.select_related('user') \
+            .only('title', 'slug', 'excerpt', 'reading_time', 'tags_cache', 'time_created', 'time_updated',
+                  'user__username')
 
 
+@condition(etag_func=post_detail_etag, last_modified_func=post_detail_last_modified)
 def post_detail(request, slug):
-    post = get_object_or_404(Post.objects.select_related('user') \
-                             .only('time_updated', 'slug', 'title', 'body',
-                                   'user__id', 'user__username', 'user__first_name', 'user__last_name', 'user__bio',
-                                   'user__git') \
-                             .prefetch_related('tags'), slug=slug)
+    """
+    Страница поста.
+    Текст поста и комментарии отрисовываются из кэша (blog/caching.py),
+    поэтому повторный просмотр поста анонимным читателем не обращается к БД.
+    Повторный запрос с If-None-Match/If-Modified-Since получает 304 до отрисовки страницы.
+    """
+    post = getattr(request, 'blog_post', None)     # выбран при расчете ETag
+    meta = cache.get(post_meta_key(slug))
+    if meta is None:
+        post = get_object_or_404(_post_detail_queryset(), slug=slug)
+        meta = _set_post_meta(post)
+
     if request.method == 'POST' and request.user.is_authenticated and request.user.is_email_activated:
         form = CommentForm(request.POST)
         if form.is_valid():
             form.instance.user = request.user
-            form.instance.post = post
+            form.instance.post_id = meta['id']
             form.save()
 
-    form = CommentForm()
-    comments = Comment.objects.values('time_created', 'body', 'user__username').filter(post=post)
-    is_author = bool(request.user == post.user)
+    def render_article():
+        obj = post or get_object_or_404(_post_detail_queryset(), pk=meta['id'])
+        return render_to_string('blog/includes/post_article.html', {'object': obj})
+
+    def render_comments():
+        return render_to_string('blog/includes/post_comments.html', {
+            'comments': Comment.objects.values('time_created', 'body', 'user__username').filter(post_id=meta['id'])
+        })
+
+    article = get_or_compute(post_article_key(meta['id'], meta['time_updated']), render_article, POST_CACHE_TIMEOUT)
+    comments = get_or_compute(post_comments_key(meta['id']), render_comments, POST_CACHE_TIMEOUT)
+
+    if post is None:
+        # легковесный экземпляр без запроса в БД, данные поста уже в отрисованном фрагменте
+        post = Post(id=meta['id'], slug=slug, user_id=meta['user_id'], time_updated=meta['time_updated'])
+    is_author = bool(request.user.is_authenticated and request.user.id == meta['user_id'])
     return render(request, 'blog/post_detail.html',
-                  {'object': post, 'form': form, 'comments': comments, 'is_author': is_author})
+                  {'object': post, 'form': CommentForm(), 'article': article, 'comments': comments,
+                   'is_author': is_author})
+
+
+def _post_detail_queryset():
+    return Post.objects.select_related('user') \
+        .only('time_updated', 'slug', 'title', 'body', 'body_html', 'tags_cache',
+              'user__id', 'user__username', 'user__first_name', 'user__last_name', 'user__bio', 'user__git')
 
 
 class PostCreateView(UserPassesTestMixin, CreateView):
@@ -80,24 +193,31 @@ class PostUpdateView(UserPassesTestMixin, UpdateView):
                   'user__id', 'user__is_email_activated')
 
 
-class ByCategoryListView(ListView):
+@method_decorator(condition(etag_func=list_etag), name='dispatch')
+class ByCategoryListView(CursorPaginationMixin, ListView):
     model = Post
     template_name = 'blog/post_list.html'
+    cursor_pagination = PAGINATE_BY_CURSOR
 
     def get_queryset(self):
         cat = Subquery(Category.objects.values('id').filter(slug=self.kwargs['slug']))
-        return Post.published.select_related('user').prefetch_related('tags') \
-            .only('title', 'slug', 'body', 'time_updated', 'user__username').filter(cat=cat)
+        return Post.published.select_related('user') \
+            .only('title', 'slug', 'excerpt', 'reading_time', 'tags_cache', 'time_created', 'time_updated',
+                  'user__username')\
+            .filter(cat=cat)
 
 
-class ByTagListView(ListView):
+@method_decorator(condition(etag_func=list_etag), name='dispatch')
+class ByTagListView(CursorPaginationMixin, ListView):
     model = Post
     template_name = 'blog/post_list.html'
+    cursor_pagination = PAGINATE_BY_CURSOR
 
     def get_queryset(self):
         tag = Subquery(BlogTag.objects.values('name').filter(slug=self.kwargs['slug']))
-        return Post.published.select_related('user').prefetch_related('tags') \
-            .only('title', 'slug', 'body', 'time_updated', 'user__username')\
+        return Post.published.select_related('user') \
+            .only('title', 'slug', 'excerpt', 'reading_time', 'tags_cache', 'time_created', 'time_updated',
+                  'user__username')\
             .filter(tags__name__in=[tag]).distinct()
 
 
@@ -122,28 +242,83 @@ def feedback(request):
     return render(request, 'blog/feedback.html', {'form': form, 'selected': 'feedback'})
 
 
-@require_POST
+@require_http_methods(['GET', 'POST'])
 def search_view(request):
-    if request.method == 'POST':
-        searched = request.POST['searched']  # <input name="searched" ...
-        if not searched:
-            return redirect(reverse('blog:home'))
-
-        # Простой поиск по нескольким полям
-        # object_list = Post.published.annotate(
-        #         search=SearchVector('title', 'body'), ).filter(search=searched)
-
-        # Поиск с выделением основ слов и ранжирование результатов
-        # config='russian' - настраиваем удаление русских стоп слов
-        search_vector = SearchVector('title', 'body', config='russian')
-        search_query = SearchQuery(searched, config='russian')
-        object_list = Post.published.select_related('user').prefetch_related('tags') \
-            .only('title', 'slug', 'body', 'time_updated', 'user__username')\
-            .annotate(search=search_vector, rank=SearchRank(search_vector, search_query))\
-            .filter(search=search_query).order_by('-rank')
-
-        return render(request, 'blog/post_list.html', {'object_list': object_list, 'search_key': searched})
-    return render(request, 'blog/post_list.html')
+    """
+    Поиск постов: GET /search/?searched=...&page=N (форма поиска), POST оставлен для совместимости.
+    Найденные id постов кэшируются (blog/search.py), из БД выбирается только текущая страница.
+    """
+    searched = normalize_query(request.GET.get('searched') or request.POST.get('searched', ''))
+    if not searched:
+        return redirect(reverse('blog:home'))
+
+    # Простой поиск по нескольким полям
+    # object_list = Post.published.annotate(
+    #         search=SearchVector('title', 'body'), ).filter(search=searched)
+
+    # Поиск с выделением основ слов и ранжирование результатов
+    # по сохраненному взвешенному вектору Post.search_vector (GIN индекс),
+    # слова набранные латиницей ищутся и в кириллице (blog/search.py)
+    # фильтры по категории и тегу, счетчики для них рассчитываются по найденным постам
+    cat, tag = request.GET.get('cat'), request.GET.get('tag')
+    post_ids, facets = search_results(searched, cat, tag)
+
+    paginator = Paginator(post_ids, PAGINATE_BY_CONST)
+    page_obj = paginator.get_page(request.GET.get('page'))
+    posts = Post.published.select_related('user') \
+        .only('title', 'slug', 'excerpt', 'reading_time', 'tags_cache', 'time_created', 'time_updated',
+              'user__username')\
+        .in_bulk(page_obj.object_list)
+    # фрагменты с найденными словами только для постов текущей страницы
+    page_obj.object_list = add_headlines([posts[pk] for pk in page_obj.object_list if pk in posts], searched)
+
+    def query(**params):
+        return urlencode({key: value for key, value in params.items() if value}) + '&'
+
+    return render(request, 'blog/post_list.html', {
+        'object_list': page_obj.object_list, 'page_obj': page_obj, 'paginator': paginator,
+        'is_paginated': page_obj.has_other_pages(), 'search_key': searched,
+        'facets': facets, 'selected_cat': cat, 'selected_tag': tag,
+        'page_query': query(searched=searched, cat=cat, tag=tag),
+        'cat_query': query(searched=searched, tag=tag),
+        'tag_query': query(searched=searched, cat=cat),
+    })
+
+
+@require_GET
+@cache_control(public=True, max_age=60)
+def search_suggest(request):
+    """ JSON подсказки для строки поиска: GET /search/suggest/?q=... """
+    return JsonResponse(suggest(request.GET.get('q', '')))
+
+
+def _cached_xml(key, get_response):
+    """ XML ответ из кэша, при отсутствии - отрисовывается ответ get_response() """
+    def render():
+        response = get_response()
+        response.render()
+        return response.content, response.headers.get('Last-Modified')
+
+    content, last_modified = get_or_compute(key, render, SITEMAP_TIMEOUT)
+    response = HttpResponse(content, content_type='application/xml')
+    if last_modified:
+        response.headers['Last-Modified'] = last_modified
+    return response
+
+
+def sitemap_index(request):
+    """ Индекс карты сайта со ссылками на страницы разделов (blog/sitemaps.py) """
+    return _cached_xml(sitemap_key(),
+                       lambda: sitemaps_views.index(request, SITEMAPS, sitemap_url_name='sitemap-section'))
+
+
+def sitemap_section(request, section):
+    """ Страница карты сайта раздела: /sitemap-posts.xml?p=N, кэшируется постранично """
+    page = request.GET.get('p', '1')
+    if section not in SITEMAPS or not page.isdigit():
+        raise Http404('Нет такой страницы карты сайта.')
+    return _cached_xml(sitemap_key(section, int(page)),
+                       lambda: sitemaps_views.sitemap(request, SITEMAPS, section=section))
 
 
 def page_not_found(request, exception):
@@ -9,6 +9,7 @@ https://docs.djangoproject.com/en/4.2/topics/settings/
 For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
+import sys
 from os import getenv, path
 from pathlib import Path
 
@@ -63,6 +64,7 @@ MIDDLEWARE = [
     "debug_toolbar.middleware.DebugToolbarMiddleware",
 
     "blog.middlewares.MiddlewareAllException",
+    "blog.middlewares.AnonymousPageCacheMiddleware",
 ]
 
 ROOT_URLCONF = 'msdevblog.urls'
@@ -79,9 +81,7 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
 
-                'blog.middlewares.categories',
-                'blog.middlewares.new_posts',
-                'blog.middlewares.tags_list',
+                'blog.middlewares.sidebar',
             ],
         },
     },
@@ -144,9 +144,39 @@ INTERNAL_IPS = ["127.0.0.1"]
 STATIC_URL = 'static/'
 STATIC_ROOT = path.join(BASE_DIR, 'static/')
 
+# collectstatic сохраняет файлы с хэшем в имени и сжатые копии .gz/.br (blog/utils.py),
+# nginx отдает их с долгим кэшированием:
+#   location /static/ { alias <STATIC_ROOT>; gzip_static on; brotli_static on; expires max; }
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'blog.utils.CompressedManifestStaticFilesStorage',
+    },
+}
+
 MEDIA_URL = 'media/'
 MEDIA_ROOT = path.join(BASE_DIR, 'media/')
 
+# Заранее отрисованные Celery RSS ленты и карта сайта (blog/tasks.py), пути файлов повторяют URL:
+#   blog/feed/index.xml, blog/feed/category/<slug>/index.xml, sitemap.xml, sitemap-posts-<p>.xml
+# nginx отдает их с диска, если файла нет - передает запрос Django:
+#   location /blog/feed/ { root <PRERENDER_ROOT>; try_files $uri/index.xml @django; }
+#   location = /sitemap.xml { root <PRERENDER_ROOT>; try_files /sitemap.xml @django; }
+#   location = /sitemap-posts.xml { root <PRERENDER_ROOT>; try_files /sitemap-posts-$arg_p.xml @django; }
+PRERENDER_ROOT = path.join(MEDIA_ROOT, 'prerendered/')
+
+# Отдача медиа файлов (blog/media.py):
+#   'django'     - файл читается и отдается по частям из Python (локальный запуск);
+#   'x-accel'    - Django только проверяет путь и ставит заголовки, файл отдает nginx по X-Accel-Redirect:
+#                  location /protected-media/ { internal; alias <MEDIA_ROOT>; }
+#   'x-sendfile' - то же для Apache (mod_xsendfile) и lighttpd по заголовку X-Sendfile.
+# По умолчанию 'django' только при DEBUG, иначе файлы отдает nginx.
+MEDIA_SERVE_MODE = getenv('MEDIA_SERVE_MODE', 'django' if DEBUG else 'x-accel')
+MEDIA_ACCEL_PREFIX = '/protected-media/'    # internal location nginx для X-Accel-Redirect
+MEDIA_MAX_AGE = 60 * 60 * 24                # кэширование браузером, секунд (файлы с хэшем в имени - год)
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
@@ -157,6 +187,14 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Пагинация, число постов на странице
 PAGINATE_BY_CONST = 25
+# Пагинация курсором по (time_created, id) вместо номеров страниц (без COUNT(*) и OFFSET)
+PAGINATE_BY_CURSOR = False
+
+# Число тегов в облаке тегов боковой панели
+TAG_CLOUD_SIZE = 30
+
+# Кэшировать фрагменты текста с найденными словами для пар (пост, запрос)
+SEARCH_HEADLINE_CACHE = True
 
 # Расширенная модель пользователя
 AUTH_USER_MODEL = "members.AdvUser"
@@ -220,6 +258,10 @@ customColorPalette = [
 
 CKEDITOR_5_CUSTOM_CSS = 'css/ckeditor5/dark_mode.css'
 CKEDITOR_5_FILE_STORAGE = 'blog.utils.CkeditorCustomStorage'
+# Загрузки редактора хранятся по хэшу содержимого (uploads/ab/cd/<sha256>.jpg): повторная загрузка
+# того же файла возвращает уже сохраненный, неиспользуемые файлы удаляет python manage.py gc_uploads.
+# False - по папкам дат загрузки (uploads/ГГГГ/ММ/ДД/<имя файла>)
+UPLOADS_CONTENT_ADDRESSED = True
 CKEDITOR_5_CONFIGS = {
     'default': {
         'toolbar': ['heading', '|', 'bold', 'italic', 'link',
@@ -282,19 +324,6 @@ CKEDITOR_5_CONFIGS = {
 }
 
 
-# Настройки кэширования
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        'TIMEOUT': 300,  # время хранения кэша (300 секунд (5 минут) - по умолчанию)
-        'OPTIONS': {
-            'MAX_ENTRIES': 300,  # количество записей кэша (300 - по умолчанию)
-            'CULL_FREQUENCY': 2,  # часть кэша, которая будет очищена (0 - весь кэш, 2 - половина, 3 - треть ...)
-        }
-    }
-}
-
-
 # настройки Celery и Radis
 # REDIS_HOST = 'redis'  # в докер контейнере
 REDIS_HOST = '0.0.0.0'  # локально
@@ -306,6 +335,46 @@ CELERY_RESULT_BACKEND = 'redis://' + REDIS_HOST + ':' + REDIS_PORT + '/0'
 CELERY_ACCEPT_CONTENT = ['application/json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
+CELERY_BEAT_SCHEDULE = {
+    'prerender-feeds-and-sitemaps': {
+        'task': 'blog.tasks.prerender_feeds_and_sitemaps',
+        'schedule': 60 * 30,   # каждые 30 минут, после публикации поста - сразу (blog/signals.py)
+    },
+}
+
+
+# Настройки кэширования
+# Общий для всех процессов кэш в Redis (база 1, база 0 занята Celery).
+# Ключи блога версионируются по пространствам имен (blog/caching.py, bump_version),
+# значения больше 1 Кб сжимаются.
+# Redis используется по умолчанию в рабочем режиме (DEBUG = False), локальный запуск и тесты
+# работают без Redis на кэше в памяти процесса. Явно включить или выключить: CACHE_REDIS=1 / CACHE_REDIS=0
+CACHE_REDIS = getenv('CACHE_REDIS', '0' if DEBUG or 'test' in sys.argv else '1') == '1'
+if CACHE_REDIS:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': 'redis://' + REDIS_HOST + ':' + REDIS_PORT + '/1',
+            'TIMEOUT': 300,  # время хранения кэша (300 секунд (5 минут) - по умолчанию)
+            'KEY_PREFIX': 'msdevblog',
+            'VERSION': 1,
+            'OPTIONS': {
+                'serializer': 'blog.caching.CompressedRedisSerializer',
+            }
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'TIMEOUT': 300,
+            'KEY_PREFIX': 'msdevblog',
+            'OPTIONS': {
+                'MAX_ENTRIES': 300,  # количество записей кэша (300 - по умолчанию)
+                'CULL_FREQUENCY': 2,  # часть кэша, которая будет очищена (0 - весь кэш, 2 - половина, 3 - треть ...)
+            }
+        }
+    }
 
 
 # настраиваем логирование
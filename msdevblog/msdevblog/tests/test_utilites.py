@@ -0,0 +1,113 @@
+"""
+Тест msdevblog.utilites.
+
+Проверяем, что однопроходные translify и slugify (str.translate) дают
+тот же результат, что и исходная реализация с последовательными str.replace.
+Замеры скорости (TranslifyBenchmark) запускаются только с переменной окружения BENCHMARK=1.
+"""
+import os
+import random
+import re
+from timeit import timeit
+from unittest import skipUnless
+
+from django.test import SimpleTestCase
+
+from msdevblog.utilites import TRANSTABLE, ALPHABET, translify, detranslify, slugify
+
+
+def reference_translify(in_string, strict=True):
+    """ Исходная реализация translify """
+    translit = in_string
+    for symb_in, symb_out in TRANSTABLE:
+        translit = translit.replace(symb_in, symb_out)
+
+    if strict and any(ord(symb) > 128 for symb in translit):
+        raise ValueError("Unicode string doesn't transliterate completely, is it russian?")
+    return translit
+
+
+def reference_detranslify(in_string):
+    """ Исходная реализация detranslify """
+    russian = str(in_string)
+    for symb_out, symb_in in TRANSTABLE:
+        russian = russian.replace(symb_in, symb_out)
+    return russian
+
+
+def reference_slugify(in_string):
+    """ Исходная реализация slugify """
+    u_in_string = str(in_string).lower()
+    u_in_string = re.sub(r'\&amp\;|\&', ' and ', u_in_string)
+    u_in_string = re.sub(r'[-\s]+', '-', u_in_string)
+    u_in_string = ''.join([symb for symb in u_in_string if symb in ALPHABET])
+    out_string = reference_translify(u_in_string)
+    return re.sub(r'[^\w\s-]', '', out_string).strip().lower()
+
+
+WORDS = ['Урок', 'flask', 'Джанго', 'щука', 'ЁЖИК', 'объявление', 'Python', 'SQL-запросы', '№1',
+         '«кавычки»', '“quotes”', 'и', '&', '&amp;', '—', '…', 'C++', 'Ёлка', 'съезд', 'подъём']
+SYMBOLS = [x[0] for x in TRANSTABLE] + list(' \t\n-_&;!?.,:()[]/\\@#$%^*+=~') + ['é', 'ü', '中', 'İ', '\x80']
+
+
+def make_titles(count, seed=0):
+    rnd = random.Random(seed)
+    titles = []
+    for _ in range(count):
+        words = rnd.choices(WORDS, k=rnd.randint(1, 8))
+        noise = ''.join(rnd.choices(SYMBOLS, k=rnd.randint(0, 10)))
+        titles.append(' '.join(words) + rnd.choice(['', ' ', ' - ', '&']) + noise)
+    return titles
+
+
+class TranslifyTestCase(SimpleTestCase):  # python manage.py test msdevblog.tests.test_utilites
+    titles = make_titles(5000)
+
+    def test_translify_equivalence(self):
+        for title in self.titles:
+            with self.subTest(title=title):
+                self.assertEqual(translify(title, strict=False), reference_translify(title, strict=False))
+
+    def test_translify_strict(self):
+        self.assertEqual(translify('Щука и ёжик'), 'Schuka i yozhik')
+        with self.assertRaises(ValueError):
+            translify('Щука 中')
+
+    def test_detranslify_equivalence(self):
+        for title in self.titles:
+            english = translify(title, strict=False)
+            with self.subTest(english=english):
+                self.assertEqual(detranslify(english), reference_detranslify(english))
+
+    def test_detranslify_sequences(self):
+        self.assertEqual(detranslify('Schuka i SCHUKA'), 'Щука и ЩУКА')
+        self.assertEqual(detranslify('flask urok'), 'фласк урок')
+        self.assertEqual(detranslify('shhh tsar'), 'шхх цар')
+        self.assertEqual(detranslify('tsche'), 'тще')
+
+    def test_slugify_equivalence(self):
+        for title in self.titles:
+            with self.subTest(title=title):
+                self.assertEqual(slugify(title), reference_slugify(title))
+
+    def test_slugify(self):
+        self.assertEqual(slugify('Название статьи 2'), 'nazvanie-stati-2')
+        self.assertEqual(slugify('Flask & Джанго -- урок №1'), 'flask-and-dzhango-urok-1')
+
+
+@skipUnless(os.getenv('BENCHMARK'), 'замеры скорости: BENCHMARK=1 python manage.py test msdevblog.tests.test_utilites')
+class TranslifyBenchmark(SimpleTestCase):
+    """ Сравнение скорости с исходной реализацией, результаты выводятся в консоль """
+
+    def benchmark(self, name, titles, number):
+        reference = timeit(lambda: [reference_slugify(title) for title in titles], number=number)
+        current = timeit(lambda: [slugify(title) for title in titles], number=number)
+        print(f'\nslugify {name}: исходная {reference:.4f} с, однопроходная {current:.4f} с, '
+              f'ускорение x{reference / current:.1f}')
+        self.assertLess(current, reference)
+
+    def test_short_titles(self):
+        self.benchmark('короткие названия', ['Урок Flask', 'Новый пост'], number=2000)
+
+    def test_bulk_import(self):
+        self.benchmark('импорт 20000 названий', make_titles(20000, seed=1), number=1)
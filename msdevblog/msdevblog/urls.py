@@ -14,28 +14,28 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+import re
+
 from django.contrib import admin
-from django.urls import path, include
-from django.contrib.sitemaps.views import sitemap
-from blog.sitemaps import PostSitemap
+from django.urls import path, re_path, include
+from blog.media import serve_media
+from blog.views import sitemap_index, sitemap_section
 from django.conf import settings
-from django.conf.urls.static import static
 
 handler404 = 'blog.views.page_not_found'
 
-sitemaps = {
-    'posts': PostSitemap,
-}
-
 
 urlpatterns = [
     path('blog/', include('blog.urls', namespace='blog')),
     path('members/', include('members.urls')),
     path('captcha/', include('captcha.urls')),
     path('admin/', admin.site.urls),
-    path('sitemap.xml', sitemap, {'sitemaps': sitemaps}, name='django.contrib.sitemaps.views.sitemap'),
+    path('sitemap.xml', sitemap_index, name='sitemap'),
+    path('sitemap-<slug:section>.xml', sitemap_section, name='sitemap-section'),
     path("ckeditor5/", include('django_ckeditor_5.urls'), name="ck_editor_5_upload_file"),
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    # медиа файлы, способ отдачи задает settings.MEDIA_SERVE_MODE (blog/media.py)
+    re_path(rf'^{re.escape(settings.MEDIA_URL.lstrip("/"))}(?P<path>.*)$', serve_media, name='media'),
+]
 
 if settings.DEBUG:
     urlpatterns.append(path('__debug__/', include('debug_toolbar.urls')))
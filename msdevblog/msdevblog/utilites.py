@@ -3,6 +3,7 @@ Simple transliteration
 """
 
 import re
+from itertools import groupby
 
 TRANSTABLE = (
     ("'", "'"),
@@ -130,6 +131,72 @@ EN_ALPHABET = [x[1] for x in TRANSTABLE]  #: English alphabet that we can detran
 ALPHABET = RU_ALPHABET + EN_ALPHABET  #: Alphabet that we can (de)transliterate
 
 
+class _DeleteMissing(dict):
+    """
+    Translation map for str.translate which deletes symbols absent in the map
+    """
+    def __missing__(self, key):
+        return None
+
+
+def _build_translify_map():
+    # All source symbols of TRANSTABLE are single characters and no output
+    # is transliterated again, so sequential replacing is equal to one
+    # str.translate pass where the first pair for a symbol wins.
+    translify_map = {}
+    for symb_in, symb_out in TRANSTABLE:
+        translify_map.setdefault(ord(symb_in), symb_out)
+    return translify_map
+
+
+def _build_slugify_map():
+    # Symbols that slugify keeps: single-char entries of ALPHABET.
+    # Each is transliterated and stripped of non-word symbols (except hyphen)
+    # in the same pass, all other symbols are deleted.
+    slugify_map = _DeleteMissing()
+    for symb in set(ALPHABET):
+        if len(symb) == 1:
+            out = TRANSLIFY_MAP.get(ord(symb), symb)
+            slugify_map[ord(symb)] = _NON_SLUG_RE.sub('', out)
+    return slugify_map
+
+
+def _build_detranslify_map():
+    # For every english sequence take the first russian symbol of TRANSTABLE,
+    # skipping identity pairs as sequential replacing did (e.g. "'" -> "‘").
+    detranslify_map = {}
+    for symb_out, symb_in in TRANSTABLE:
+        if detranslify_map.get(symb_in, symb_in) == symb_in:
+            detranslify_map[symb_in] = symb_out
+    return detranslify_map
+
+
+TRANSLIFY_MAP = _build_translify_map()  #: str.translate map for translify
+DETRANSLIFY_MAP = _build_detranslify_map()  #: english sequence -> russian symbol map for detranslify
+
+
+def _build_detranslify_patterns():
+    # TRANSTABLE lists sequences of the same length in a row (longest first, upper case
+    # before lower case), so one compiled pattern per such run replaces sequential
+    # replacing: "tsch" is still "тщ", not "цч", because "sch" goes before "ts".
+    sequences = [symb for symb, russian in DETRANSLIFY_MAP.items() if symb != russian]
+    return [re.compile('|'.join(re.escape(symb) for symb in run))
+            for _, run in groupby(sequences, key=len)]
+
+
+_DETRANSLIFY_RES = _build_detranslify_patterns()
+_NON_ASCII_RE = re.compile(r'[^\x00-\x80]')
+_NON_SLUG_RE = re.compile(r'[^\w\s-]')
+_SEPARATORS_RE = re.compile(r'(?:[-\s]|&amp;|&)+')
+_SPACES_RE = re.compile(r'[-\s]+')
+SLUGIFY_MAP = _build_slugify_map()  #: str.translate map for slugify
+
+
+def _collapse_separators(match):
+    # convert & to "and", then replace spaces by hyphen
+    return _SPACES_RE.sub('-', match.group().replace('&amp;', ' and ').replace('&', ' and '))
+
+
 def translify(in_string, strict=True):
     """
     Translify russian text
@@ -147,11 +214,9 @@ def translify(in_string, strict=True):
     @raise ValueError: when string doesn't transliterate completely.
         Raised only if strict=True
     """
-    translit = in_string
-    for symb_in, symb_out in TRANSTABLE:
-        translit = translit.replace(symb_in, symb_out)
+    translit = in_string.translate(TRANSLIFY_MAP)
 
-    if strict and any(ord(symb) > 128 for symb in translit):
+    if strict and _NON_ASCII_RE.search(translit):
         raise ValueError("Unicode string doesn't transliterate completely, " + \
                          "is it russian?")
 
@@ -177,8 +242,9 @@ def detranslify(in_string):
                          "then it consists only ASCII chars, but now it doesn't. " + \
                          "Use unicode in this case.")
 
-    for symb_out, symb_in in TRANSTABLE:
-        russian = russian.replace(symb_in, symb_out)
+    # longest-match: a pass per run of TRANSTABLE sequences of the same length
+    for pattern in _DETRANSLIFY_RES:
+        russian = pattern.sub(lambda match: DETRANSLIFY_MAP[match.group()], russian)
 
     # TODO: выбрать правильный регистр для ь и ъ
     # твердый и мягкий знак в dentranslify всегда будут в верхнем регистре
@@ -204,16 +270,10 @@ def slugify(in_string):
         raise ValueError("We expects when in_string is str type," + \
                          "it is an ascii, but now it isn't. Use unicode " + \
                          "in this case.")
-    # convert & to "and"
-    u_in_string = re.sub(r'\&amp\;|\&', ' and ', u_in_string)
-    # replace spaces by hyphen
-    u_in_string = re.sub(r'[-\s]+', '-', u_in_string)
-    # remove symbols that not in alphabet
-    u_in_string = ''.join([symb for symb in u_in_string if symb in ALPHABET])
-    # translify it
-    out_string = translify(u_in_string)
-    # remove non-alpha
-    return re.sub(r'[^\w\s-]', '', out_string).strip().lower()
+    # convert & to "and" and replace spaces by hyphen in one pass
+    u_in_string = _SEPARATORS_RE.sub(_collapse_separators, u_in_string)
+    # remove symbols that not in alphabet, translify it and remove non-alpha in one pass
+    return u_in_string.translate(SLUGIFY_MAP).strip().lower()
 
 
 def dirify(in_string):